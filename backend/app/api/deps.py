@@ -2,46 +2,155 @@
 API Dependencies
 Common dependencies for authentication and database access
 """
+import hashlib
+import time
+from datetime import datetime
+from functools import partial
 from typing import Optional
 from uuid import UUID
-from fastapi import Depends, HTTPException, status
+import orjson
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, true, lambda_stmt
 
+from app.cache import cache_get, cache_set, cache_delete, cache_invalidate
 from app.config import settings
 from app.database import get_db
 from app.models.user import User, UserRole
+from app.models.asset import Asset
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
+_BEARER_PREFIX = "Bearer "
+_BEARER_PREFIX_LEN = len(_BEARER_PREFIX)
+
+
+class BearerTokenScheme(OAuth2PasswordBearer):
+    """OAuth2PasswordBearer with a fast path for the canonical 'Bearer <token>' header"""
+    
+    async def __call__(self, request: Request) -> Optional[str]:
+        authorization = request.headers.get("authorization")
+        if authorization and authorization.startswith(_BEARER_PREFIX):
+            return authorization[_BEARER_PREFIX_LEN:]
+        # Anything else (missing header, other casing) takes the standard path
+        return await super().__call__(request)
+
+
+oauth2_scheme = BearerTokenScheme(tokenUrl="/api/v1/auth/login")
+
+# Pre-built JWT decoder (key and algorithms are fixed for the process lifetime)
+decode_token = partial(
+    jwt.decode,
+    key=settings.jwt_secret_key,
+    algorithms=(settings.jwt_algorithm,),
+)
+
+# Resolved users are cached briefly so most requests skip the JWT verify + user SELECT.
+# Keep this well below the access token lifetime so revocation stays bounded.
+AUTH_CACHE_TTL = 30
+
+# Columns snapshotted into the auth cache (enough for UserResponse and access checks)
+_CACHED_USER_FIELDS = (
+    "id", "email", "full_name", "phone", "role", "company_id",
+    "is_active", "is_verified", "last_login_at", "created_at",
+)
+
+
+def _auth_cache_key(token: str) -> str:
+    """Cache key for a bearer token (never store the raw token)"""
+    return "auth:" + hashlib.blake2b(token.encode(), digest_size=16).hexdigest()
+
+
+def _user_cache_tag(user_id) -> str:
+    """Cache tag grouping every cached token of a user"""
+    return f"auth:user:{user_id}"
+
+
+def _dump_user(user: User) -> str:
+    """Serialize the cached user snapshot"""
+    data = {field: getattr(user, field) for field in _CACHED_USER_FIELDS}
+    data["role"] = user.role.value
+    return orjson.dumps(data).decode()
+
+
+def _load_user(raw: str) -> User:
+    """Rebuild a detached User from a cached snapshot"""
+    data = orjson.loads(raw)
+    data["id"] = UUID(data["id"])
+    data["role"] = UserRole(data["role"])
+    if data["company_id"]:
+        data["company_id"] = UUID(data["company_id"])
+    for field in ("last_login_at", "created_at"):
+        if data[field]:
+            data[field] = datetime.fromisoformat(data[field])
+    return User(**data)
+
+
+async def invalidate_user_cache(user_id) -> None:
+    """Drop cached auth entries for a user (call after role/status/profile changes)"""
+    await cache_invalidate(_user_cache_tag(user_id))
+
+
+# Admin user listings are cached briefly under one tag
+USER_LIST_CACHE_TTL = 60
+USER_LIST_CACHE_TAG = "users:list"
+
+
+async def invalidate_user_list_cache() -> None:
+    """Drop every cached user listing (call after creating, updating or deleting users)"""
+    await cache_invalidate(USER_LIST_CACHE_TAG)
+
+
+def revoked_user_key(user_id) -> str:
+    """Redis key marking all refresh tokens of a user as revoked"""
+    return f"auth:revoked:user:{user_id}"
+
+
+def revoked_jti_key(jti: str) -> str:
+    """Redis key marking a single (already rotated) refresh token as revoked"""
+    return f"auth:revoked:jti:{jti}"
+
+
+async def set_user_revoked(user_id, revoked: bool) -> None:
+    """Revoke (or restore) a user's refresh tokens, e.g. on deactivation or delete"""
+    if revoked:
+        ttl = settings.refresh_token_expire_days * 24 * 60 * 60
+        await cache_set(revoked_user_key(user_id), "1", ttl)
+    else:
+        await cache_delete(revoked_user_key(user_id))
 
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: AsyncSession = Depends(get_db)
 ) -> User:
-    """Get current authenticated user from JWT token"""
+    """
+    Get current authenticated user from JWT token
+    Cached users are detached from the session; load the row explicitly before mutating it
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     
+    cache_key = _auth_cache_key(token)
+    cached = await cache_get(cache_key)
+    if cached:
+        return _load_user(cached)
+    
     try:
-        payload = jwt.decode(
-            token, 
-            settings.jwt_secret_key, 
-            algorithms=[settings.jwt_algorithm]
-        )
+        payload = decode_token(token)
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
     
+    # Hottest query in the app: built and cache-keyed once as a lambda statement
+    user_uuid = UUID(user_id)
     result = await db.execute(
-        select(User).where(User.id == UUID(user_id))
+        lambda_stmt(lambda: select(User).where(User.id == user_uuid))
     )
     user = result.scalar_one_or_none()
     
@@ -54,6 +163,13 @@ async def get_current_user(
             detail="User account is inactive"
         )
     
+    # Never cache past the token's own expiry
+    ttl = AUTH_CACHE_TTL
+    if payload.get("exp"):
+        ttl = min(ttl, int(payload["exp"] - time.time()))
+    if ttl > 0:
+        await cache_set(cache_key, _dump_user(user), ttl, tag=_user_cache_tag(user.id))
+    
     return user
 
 
@@ -105,3 +221,87 @@ class CompanyFilter:
             query = query.filter_by(company_id=self.company_id)
         return query
 
+
+def company_scope(user: User, column=Asset.company_id):
+    """WHERE criterion limiting rows to the user's company (no-op for super admins)"""
+    if user.role != UserRole.SUPER_ADMIN and user.company_id:
+        return column == user.company_id
+    return true()
+
+
+def check_asset_access(user: User, asset: Asset) -> None:
+    """Raise 403 unless the user may access the asset's company"""
+    if (
+        user.role != UserRole.SUPER_ADMIN 
+        and asset.company_id != user.company_id
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+
+
+async def fetch_company_record(db: AsyncSession, user: User, model, *criteria, detail: str):
+    """
+    Load a row owned via its asset (certificate, test) with the company check in SQL
+    Rows outside the user's company are indistinguishable from missing ones (404)
+    """
+    query = select(model).join(model.asset).where(*criteria)
+    if user.role != UserRole.SUPER_ADMIN:
+        query = query.where(Asset.company_id == user.company_id)
+    
+    result = await db.execute(query)
+    record = result.scalar_one_or_none()
+    
+    if not record:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=detail
+        )
+    
+    return record
+
+
+async def fetch_accessible_asset(
+    db: AsyncSession,
+    user: User,
+    *criteria,
+    for_update: bool = False
+) -> Asset:
+    """Load a live asset matching criteria, enforcing company access (404/403)"""
+    query = select(Asset).where(*criteria)
+    if for_update:
+        query = query.with_for_update()
+    
+    result = await db.execute(query)
+    asset = result.scalar_one_or_none()
+    
+    if not asset:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Asset not found"
+        )
+    
+    check_asset_access(user, asset)
+    
+    return asset
+
+
+async def get_accessible_asset(
+    asset_id: UUID,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+) -> Asset:
+    """Dependency: asset from the path, readable by the current user"""
+    return await fetch_accessible_asset(db, current_user, Asset.id == asset_id)
+
+
+async def get_accessible_asset_for_update(
+    asset_id: UUID,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+) -> Asset:
+    """Dependency: asset from the path, row-locked (FOR UPDATE) for modification"""
+    return await fetch_accessible_asset(
+        db, current_user, Asset.id == asset_id, for_update=True
+    )
@@ -0,0 +1,32 @@
+"""
+Response Helpers
+Build response schemas from trusted database rows without re-validation
+"""
+from typing import Any, Iterable, Mapping, Optional, Type, TypeVar
+
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+SchemaT = TypeVar("SchemaT", bound=BaseModel)
+
+
+def to_response(schema: Type[SchemaT], obj: Any) -> SchemaT:
+    """
+    Build a response schema from an ORM object loaded from the database
+    Values were validated on write, so model_construct skips validation here
+    """
+    return schema.model_construct(
+        **{name: getattr(obj, name) for name in schema.model_fields}
+    )
+
+
+def orm_json(
+    schema: Type[BaseModel],
+    objects: Iterable[Any],
+    headers: Optional[Mapping[str, str]] = None,
+) -> ORJSONResponse:
+    """Serialize ORM objects as a JSON list of schema dumps (bypasses response_model)"""
+    return ORJSONResponse(
+        [to_response(schema, obj).model_dump() for obj in objects],
+        headers=headers,
+    )
@@ -2,30 +2,59 @@
 Asset Routes
 Equipment Registry Management
 """
-import uuid
 from typing import Optional, List
-from datetime import date
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from datetime import date, datetime, timedelta, timezone
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Query
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, or_
+from sqlalchemy import select, func, or_, tuple_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import selectinload
 
 from app.database import get_db
+from app.ids import uuid7
 from app.models.user import User, UserRole
 from app.models.asset import Asset, AssetCategory, AssetType, AssetStatus
 from app.schemas.asset import (
     AssetCreate, AssetUpdate, AssetResponse, AssetListResponse, AssetQRScan
 )
-from app.api.deps import get_current_user, require_inspector
-from app.services.qr_service import generate_qr_code
+from app.api.deps import (
+    get_current_user, require_inspector,
+    fetch_accessible_asset, get_accessible_asset, get_accessible_asset_for_update
+)
+from app.api.pagination import decode_cursor, split_page
+from app.api.responses import to_response
+from app.services.qr_service import render_asset_qr
 
 router = APIRouter()
 
+# Columns selected for AssetListItem (list views skip the wide columns)
+ASSET_LIST_COLUMNS = (
+    Asset.id,
+    Asset.company_id,
+    Asset.asset_code,
+    Asset.name,
+    Asset.category,
+    Asset.asset_type,
+    Asset.status,
+    Asset.serial_number,
+    Asset.location,
+    Asset.safe_working_load,
+    Asset.swl_unit,
+    Asset.certificate_expiry_date,
+    Asset.created_at,
+)
+
+
+def asset_json(asset: Asset) -> ORJSONResponse:
+    """Serialize an asset loaded from the database straight to JSON"""
+    return ORJSONResponse(to_response(AssetResponse, asset).model_dump())
+
 
 @router.get("", response_model=AssetListResponse)
 async def list_assets(
-    page: int = Query(1, ge=1),
-    page_size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
     search: Optional[str] = None,
     category: Optional[AssetCategory] = None,
     asset_type: Optional[AssetType] = None,
@@ -34,85 +63,75 @@ async def list_assets(
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """List all assets with pagination and filters"""
-    query = select(Asset).where(Asset.is_deleted == False)
-    count_query = select(func.count(Asset.id)).where(Asset.is_deleted == False)
+    """List assets with keyset (cursor) pagination and filters"""
+    today = date.today()
+    
+    # Expiry flags are computed in SQL by the Asset hybrid properties
+    is_expiring_soon = Asset.is_certificate_expiring_soon.label("is_certificate_expiring_soon")
+    is_expired = Asset.is_certificate_expired.label("is_certificate_expired")
+    
+    # Predicates are collected in index order: equality columns first
+    # (matching ix_assets_tenant_feed), then ranges, then text search.
+    # Soft-deleted rows are excluded by the session-wide Asset filter.
+    filters = []
     
     # Filter by company
     if current_user.role != UserRole.SUPER_ADMIN and current_user.company_id:
-        query = query.where(Asset.company_id == current_user.company_id)
-        count_query = count_query.where(Asset.company_id == current_user.company_id)
-    
-    # Search filter
-    if search:
-        search_filter = or_(
-            Asset.name.ilike(f"%{search}%"),
-            Asset.asset_code.ilike(f"%{search}%"),
-            Asset.serial_number.ilike(f"%{search}%"),
-            Asset.location.ilike(f"%{search}%"),
-        )
-        query = query.where(search_filter)
-        count_query = count_query.where(search_filter)
+        filters.append(Asset.company_id == current_user.company_id)
     
     # Category filter
     if category:
-        query = query.where(Asset.category == category)
-        count_query = count_query.where(Asset.category == category)
+        filters.append(Asset.category == category)
     
     # Type filter
     if asset_type:
-        query = query.where(Asset.asset_type == asset_type)
-        count_query = count_query.where(Asset.asset_type == asset_type)
+        filters.append(Asset.asset_type == asset_type)
     
     # Status filter
     if status:
-        query = query.where(Asset.status == status)
-        count_query = count_query.where(Asset.status == status)
+        filters.append(Asset.status == status)
     
-    # Expiring soon filter
+    # Expiring soon filter (single range)
     if expiring_soon:
-        from datetime import timedelta
-        soon_date = date.today() + timedelta(days=30)
-        query = query.where(
-            Asset.certificate_expiry_date <= soon_date,
-            Asset.certificate_expiry_date >= date.today()
+        filters.append(
+            Asset.certificate_expiry_date.between(today, today + timedelta(days=30))
         )
-        count_query = count_query.where(
-            Asset.certificate_expiry_date <= soon_date,
-            Asset.certificate_expiry_date >= date.today()
+    
+    # Keyset pagination: continue after the last row of the previous page
+    after = decode_cursor(cursor)
+    if after:
+        filters.append(tuple_(Asset.created_at, Asset.id) < tuple_(*after))
+    
+    # Search filter (GIN-indexed: full-text document, plus partial asset codes)
+    if search:
+        filters.append(
+            or_(
+                Asset.search_tsv.op("@@")(func.plainto_tsquery("simple", search)),
+                Asset.asset_code.ilike(f"%{search}%"),
+            )
         )
     
-    # Get total count
-    total_result = await db.execute(count_query)
-    total = total_result.scalar()
+    query = select(*ASSET_LIST_COLUMNS, is_expiring_soon, is_expired).where(*filters)
     
-    # Pagination
-    offset = (page - 1) * page_size
-    query = query.offset(offset).limit(page_size).order_by(Asset.created_at.desc())
+    # Fetch one extra row to detect whether another page exists
+    query = query.order_by(Asset.created_at.desc(), Asset.id.desc()).limit(limit + 1)
     
     result = await db.execute(query)
-    assets = result.scalars().all()
-    
-    # Calculate computed properties
-    asset_responses = []
-    for asset in assets:
-        response = AssetResponse.model_validate(asset)
-        response.is_certificate_expiring_soon = asset.is_certificate_expiring_soon
-        response.is_certificate_expired = asset.is_certificate_expired
-        asset_responses.append(response)
+    rows, next_cursor = split_page(result.all(), limit)
     
-    return AssetListResponse(
-        items=asset_responses,
-        total=total,
-        page=page,
-        page_size=page_size,
-        pages=(total + page_size - 1) // page_size
-    )
+    # Rows come straight from the database, so skip response_model
+    # re-validation and let orjson encode UUIDs, dates and enums natively
+    return ORJSONResponse({
+        "items": [dict(row._mapping) for row in rows],
+        "next_cursor": next_cursor,
+        "limit": limit,
+    })
 
 
 @router.post("", response_model=AssetResponse, status_code=status.HTTP_201_CREATED)
 async def create_asset(
     asset_data: AssetCreate,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(require_inspector),
     db: AsyncSession = Depends(get_db)
 ):
@@ -126,34 +145,30 @@ async def create_asset(
             detail="Company ID is required"
         )
     
-    # Check if asset code exists in company
-    result = await db.execute(
-        select(Asset).where(
-            Asset.company_id == company_id,
-            Asset.asset_code == asset_data.asset_code,
-            Asset.is_deleted == False
-        )
-    )
-    if result.scalar_one_or_none():
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Asset code already exists in this company"
-        )
-    
-    # Create asset
+    # Create asset (ID assigned up front so the QR data is known before insert)
+    asset_id = uuid7()
     asset = Asset(
+        id=asset_id,
         company_id=company_id,
+        qr_data=f"CT-{asset_id}",
         **asset_data.model_dump(exclude={"company_id"})
     )
     
-    # Generate QR code
-    qr_data = f"CT-{asset.id}"
-    asset.qr_data = qr_data
-    asset.qr_code = await generate_qr_code(qr_data, str(asset.id))
-    
     db.add(asset)
-    await db.flush()
-    await db.refresh(asset)
+    
+    # Asset code uniqueness is enforced by ix_assets_company_code
+    try:
+        await db.flush()
+    except IntegrityError as e:
+        if "ix_assets_company_code" not in str(e.orig):
+            raise
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Asset code already exists in this company"
+        )
+    
+    # Render the QR image after the response is sent
+    background_tasks.add_task(render_asset_qr, asset.id, asset.qr_data)
     
     return asset
 
@@ -165,187 +180,61 @@ async def scan_asset_qr(
     db: AsyncSession = Depends(get_db)
 ):
     """Get asset by QR code data (used when scanning QR)"""
-    result = await db.execute(
-        select(Asset).where(
-            Asset.qr_data == qr_data,
-            Asset.is_deleted == False
-        )
-    )
-    asset = result.scalar_one_or_none()
-    
-    if not asset:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Asset not found"
-        )
-    
-    # Check company access
-    if (
-        current_user.role != UserRole.SUPER_ADMIN 
-        and asset.company_id != current_user.company_id
-    ):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
-        )
-    
-    return asset
+    asset = await fetch_accessible_asset(db, current_user, Asset.qr_data == qr_data)
+    return asset_json(asset)
 
 
 @router.get("/{asset_id}", response_model=AssetResponse)
 async def get_asset(
-    asset_id: uuid.UUID,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    asset: Asset = Depends(get_accessible_asset),
 ):
     """Get asset by ID"""
-    result = await db.execute(
-        select(Asset).where(
-            Asset.id == asset_id,
-            Asset.is_deleted == False
-        )
-    )
-    asset = result.scalar_one_or_none()
-    
-    if not asset:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Asset not found"
-        )
-    
-    # Check company access
-    if (
-        current_user.role != UserRole.SUPER_ADMIN 
-        and asset.company_id != current_user.company_id
-    ):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
-        )
-    
-    return asset
+    return asset_json(asset)
 
 
 @router.put("/{asset_id}", response_model=AssetResponse)
 async def update_asset(
-    asset_id: uuid.UUID,
     asset_data: AssetUpdate,
     current_user: User = Depends(require_inspector),
+    asset: Asset = Depends(get_accessible_asset_for_update),
     db: AsyncSession = Depends(get_db)
 ):
     """Update asset"""
-    result = await db.execute(
-        select(Asset).where(
-            Asset.id == asset_id,
-            Asset.is_deleted == False
-        )
-    )
-    asset = result.scalar_one_or_none()
-    
-    if not asset:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Asset not found"
-        )
-    
-    # Check company access
-    if (
-        current_user.role != UserRole.SUPER_ADMIN 
-        and asset.company_id != current_user.company_id
-    ):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
-        )
-    
     update_data = asset_data.model_dump(exclude_unset=True)
     
     for field, value in update_data.items():
         setattr(asset, field, value)
     
+    # Row is locked and in-session; updated_at comes back via RETURNING, so no refresh needed
     await db.flush()
-    await db.refresh(asset)
     
     return asset
 
 
 @router.delete("/{asset_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_asset(
-    asset_id: uuid.UUID,
     current_user: User = Depends(require_inspector),
+    asset: Asset = Depends(get_accessible_asset_for_update),
     db: AsyncSession = Depends(get_db)
 ):
     """Soft delete asset"""
-    from datetime import datetime
-    
-    result = await db.execute(
-        select(Asset).where(
-            Asset.id == asset_id,
-            Asset.is_deleted == False
-        )
-    )
-    asset = result.scalar_one_or_none()
-    
-    if not asset:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Asset not found"
-        )
-    
-    # Check company access
-    if (
-        current_user.role != UserRole.SUPER_ADMIN 
-        and asset.company_id != current_user.company_id
-    ):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
-        )
-    
     # Soft delete
     asset.is_deleted = True
-    asset.deleted_at = datetime.utcnow()
+    asset.deleted_at = datetime.now(timezone.utc)
     await db.flush()
 
 
-@router.get("/{asset_id}/qr-code")
+@router.get("/{asset_id}/qr-code", status_code=status.HTTP_202_ACCEPTED)
 async def regenerate_qr_code(
-    asset_id: uuid.UUID,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(require_inspector),
+    asset: Asset = Depends(get_accessible_asset_for_update),
     db: AsyncSession = Depends(get_db)
 ):
     """Regenerate QR code for asset"""
-    result = await db.execute(
-        select(Asset).where(
-            Asset.id == asset_id,
-            Asset.is_deleted == False
-        )
-    )
-    asset = result.scalar_one_or_none()
-    
-    if not asset:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Asset not found"
-        )
-    
-    # Check company access
-    if (
-        current_user.role != UserRole.SUPER_ADMIN 
-        and asset.company_id != current_user.company_id
-    ):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
-        )
-    
-    # Regenerate QR
-    qr_data = f"CT-{asset.id}"
-    asset.qr_data = qr_data
-    asset.qr_code = await generate_qr_code(qr_data, str(asset.id))
-    
+    # Regenerate QR after the response is sent (re-rendered even if the file exists)
+    asset.qr_data = f"CT-{asset.id}"
     await db.flush()
-    await db.refresh(asset)
+    background_tasks.add_task(render_asset_qr, asset.id, asset.qr_data, force=True)
     
     return {"qr_code": asset.qr_code, "qr_data": asset.qr_data}
-
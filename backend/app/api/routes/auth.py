@@ -1,18 +1,27 @@
 """
 Authentication Routes
 """
-from datetime import datetime, timedelta
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from typing import Optional
-from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, status
+from uuid import UUID, uuid4
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, exists
 from jose import jwt
 from passlib.context import CryptContext
 
 from app.config import settings
 from app.database import get_db
+from app.ids import uuid7
+from app.api.deps import (
+    decode_token, revoked_user_key, revoked_jti_key, invalidate_user_list_cache
+)
+from app.cache import cache_claim, cache_exists
 from app.models.user import User, Company, UserRole
 from app.schemas.user import (
     UserCreate, UserResponse, UserLogin, Token,
@@ -20,46 +29,76 @@ from app.schemas.user import (
 )
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# argon2id for new hashes; existing bcrypt hashes still verify and are upgraded on login
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    default="argon2",
+    deprecated=["bcrypt"],
+    argon2__type="id",
+    argon2__memory_cost=19456,
+    argon2__time_cost=2,
+    argon2__parallelism=1,
+)
+# Load the hash backends at import rather than on the first login
+pwd_context.handler("argon2").get_backend()
+pwd_context.handler("bcrypt").get_backend()
+
+# Hashing is CPU-bound (and releases the GIL), so keep it off the event loop
+_pwd_executor = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="pwd")
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify password against hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _pwd_executor, pwd_context.verify, plain_password, hashed_password
+    )
 
 
-def get_password_hash(password: str) -> str:
+async def get_password_hash(password: str) -> str:
     """Hash a password"""
-    return pwd_context.hash(password)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pwd_executor, pwd_context.hash, password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token"""
     to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
+    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=15))
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, settings.jwt_secret_key, algorithm=settings.jwt_algorithm)
 
 
 def create_refresh_token(data: dict) -> str:
-    """Create JWT refresh token"""
+    """Create JWT refresh token (with a unique jti so it can be revoked on rotation)"""
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(days=settings.refresh_token_expire_days)
-    to_encode.update({"exp": expire})
+    expire = datetime.now(timezone.utc) + timedelta(days=settings.refresh_token_expire_days)
+    to_encode.update({"exp": expire, "jti": uuid4().hex})
     return jwt.encode(to_encode, settings.jwt_secret_key, algorithm=settings.jwt_algorithm)
 
 
+def _token_claims(user: User) -> dict:
+    """Identity claims shared by access and refresh tokens"""
+    return {
+        "sub": str(user.id),
+        "role": user.role.value,
+        "company_id": str(user.company_id) if user.company_id else None,
+    }
+
+
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def register(
     user_data: UserCreate,
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db)
 ):
     """Register a new user"""
     # Check if email exists
-    result = await db.execute(
-        select(User).where(User.email == user_data.email)
+    email_taken = await db.scalar(
+        select(exists().where(User.email == user_data.email))
     )
-    if result.scalar_one_or_none():
+    if email_taken:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
@@ -68,16 +107,19 @@ async def register(
     # Create user
     user = User(
         email=user_data.email,
-        hashed_password=get_password_hash(user_data.password),
+        hashed_password=await get_password_hash(user_data.password),
         full_name=user_data.full_name,
         phone=user_data.phone,
         role=user_data.role,
         company_id=user_data.company_id,
     )
     
+    # Server defaults come back via INSERT ... RETURNING, so no refresh is needed
     db.add(user)
     await db.flush()
-    await db.refresh(user)
+    
+    # Cached user listings are dropped once the new user is committed
+    background_tasks.add_task(invalidate_user_list_cache)
     
     return user
 
@@ -88,52 +130,53 @@ async def register_company(
     admin_email: str,
     admin_password: str,
     admin_name: str,
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db)
 ):
     """Register a new company with admin user"""
-    # Check if slug exists
+    # Check slug and admin email in one round trip
     result = await db.execute(
-        select(Company).where(Company.slug == company_data.slug)
+        select(
+            exists().where(Company.slug == company_data.slug),
+            exists().where(User.email == admin_email),
+        )
     )
-    if result.scalar_one_or_none():
+    slug_taken, email_taken = result.one()
+    
+    if slug_taken:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Company slug already exists"
         )
     
-    # Check if admin email exists
-    result = await db.execute(
-        select(User).where(User.email == admin_email)
-    )
-    if result.scalar_one_or_none():
+    if email_taken:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Admin email already registered"
         )
     
-    # Create company
+    # Create company and admin user; both INSERTs go out in a single flush
     company = Company(
+        id=uuid7(),
         name=company_data.name,
         slug=company_data.slug,
         email=company_data.email,
         phone=company_data.phone,
         address=company_data.address,
     )
-    db.add(company)
-    await db.flush()
-    
-    # Create admin user
     admin_user = User(
         email=admin_email,
-        hashed_password=get_password_hash(admin_password),
+        hashed_password=await get_password_hash(admin_password),
         full_name=admin_name,
         role=UserRole.COMPANY_ADMIN,
         company_id=company.id,
         is_verified=True,
     )
-    db.add(admin_user)
+    db.add_all([company, admin_user])
     await db.flush()
-    await db.refresh(company)
+    
+    # Cached user listings are dropped once the new admin is committed
+    background_tasks.add_task(invalidate_user_list_cache)
     
     return company
 
@@ -149,7 +192,7 @@ async def login(
     )
     user = result.scalar_one_or_none()
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not await verify_password(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -162,22 +205,21 @@ async def login(
             detail="User account is inactive"
         )
     
+    # Upgrade legacy (bcrypt) hashes now that we have the plain password
+    if pwd_context.needs_update(user.hashed_password):
+        user.hashed_password = await get_password_hash(form_data.password)
+    
     # Update last login
-    user.last_login_at = datetime.utcnow()
+    user.last_login_at = datetime.now(timezone.utc)
     await db.flush()
     
     # Create tokens
+    claims = _token_claims(user)
     access_token = create_access_token(
-        data={
-            "sub": str(user.id),
-            "role": user.role.value,
-            "company_id": str(user.company_id) if user.company_id else None,
-        },
+        data=claims,
         expires_delta=timedelta(minutes=settings.access_token_expire_minutes)
     )
-    refresh_token = create_refresh_token(
-        data={"sub": str(user.id)}
-    )
+    refresh_token = create_refresh_token(data=claims)
     
     return Token(
         access_token=access_token,
@@ -191,13 +233,13 @@ async def refresh_token(
     refresh_token: str,
     db: AsyncSession = Depends(get_db)
 ):
-    """Refresh access token"""
+    """
+    Refresh access token
+    A valid, unrevoked refresh token is trusted as-is; the user row is only
+    read for legacy tokens without claims or when Redis is unavailable
+    """
     try:
-        payload = jwt.decode(
-            refresh_token,
-            settings.jwt_secret_key,
-            algorithms=[settings.jwt_algorithm]
-        )
+        payload = decode_token(refresh_token)
         user_id = payload.get("sub")
         if not user_id:
             raise HTTPException(
@@ -210,29 +252,48 @@ async def refresh_token(
             detail="Invalid refresh token"
         )
     
-    result = await db.execute(
-        select(User).where(User.id == UUID(user_id))
-    )
-    user = result.scalar_one_or_none()
+    revoked = await cache_exists(revoked_user_key(user_id))
     
-    if not user or not user.is_active:
+    # Rotate: claim the presented token's jti in one SET NX, so of two concurrent
+    # refreshes with the same token only one gets new tokens
+    jti = payload.get("jti")
+    claimed = None
+    if jti and revoked is False:
+        remaining = max(int(payload["exp"] - time.time()), 1)
+        claimed = await cache_claim(revoked_jti_key(jti), remaining)
+    
+    if revoked or claimed is False:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found or inactive"
+            detail="Refresh token revoked"
         )
     
+    # Redis unavailable (or a legacy token): fall back to the user row
+    if claimed is None or "role" not in payload:
+        result = await db.execute(
+            select(User).where(User.id == UUID(user_id))
+        )
+        user = result.scalar_one_or_none()
+        
+        if not user or not user.is_active:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found or inactive"
+            )
+        claims = _token_claims(user)
+    else:
+        claims = {
+            "sub": user_id,
+            "role": payload["role"],
+            "company_id": payload.get("company_id"),
+        }
+    
     # Create new tokens
     new_access_token = create_access_token(
-        data={
-            "sub": str(user.id),
-            "role": user.role.value,
-            "company_id": str(user.company_id) if user.company_id else None,
-        },
+        data=claims,
         expires_delta=timedelta(minutes=settings.access_token_expire_minutes)
     )
-    new_refresh_token = create_refresh_token(
-        data={"sub": str(user.id)}
-    )
+    new_refresh_token = create_refresh_token(data=claims)
     
     return Token(
         access_token=new_access_token,
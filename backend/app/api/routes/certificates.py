@@ -2,15 +2,19 @@
 Certificate Routes
 Digital Certificate Management
 """
+import os
 import uuid
-from datetime import datetime, date, timedelta
+import orjson
+from datetime import datetime, date, timedelta, timezone
 from typing import Optional, List
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Query
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, func, tuple_, update
+from sqlalchemy.orm import load_only
 
+from app.cache import cache_get, cache_set, cache_delete
+from app.config import settings
 from app.database import get_db
 from app.models.user import User, UserRole
 from app.models.asset import Asset
@@ -20,27 +24,62 @@ from app.schemas.certificate import (
     CertificateCreate, CertificateUpdate, CertificateResponse, 
     CertificateGenerateRequest
 )
-from app.api.deps import get_current_user, require_inspector
-from app.services.certificate_service import (
-    generate_certificate_number, 
-    generate_certificate_pdf
+from app.api.deps import (
+    get_current_user, require_inspector, fetch_accessible_asset, fetch_company_record
 )
+from app.api.pagination import NEXT_CURSOR_HEADER, decode_cursor, split_page
+from app.api.responses import orm_json
+from app.services.certificate_service import render_certificate_pdf
 
 router = APIRouter()
 
+# Columns loaded for list_certificates (exactly the CertificateResponse fields)
+CERTIFICATE_RESPONSE_COLUMNS = tuple(
+    getattr(Certificate, name) for name in CertificateResponse.model_fields
+)
+
+# Public verification results are cached briefly (scraping/QR scan bursts)
+VERIFY_CACHE_TTL = 60
+
+
+def _verify_cache_key(certificate_number: str) -> str:
+    """Redis key for a cached verification result"""
+    return f"verify:{certificate_number}"
+
+
+def _pdf_status(certificate: Certificate) -> dict:
+    """Render state of a certificate's PDF as returned by /pdf-status"""
+    if certificate.pdf_url is not None:
+        pdf_status = "ready"
+    elif certificate.pdf_error is not None:
+        pdf_status = "failed"
+    else:
+        pdf_status = "pending"
+    return {
+        "certificate_id": certificate.id,
+        "status": pdf_status,
+        "ready": pdf_status == "ready",
+        "pdf_url": certificate.pdf_url,
+        "error": certificate.pdf_error,
+    }
+
 
 @router.get("", response_model=List[CertificateResponse])
 async def list_certificates(
-    page: int = Query(1, ge=1),
-    page_size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
     asset_id: Optional[uuid.UUID] = None,
     status: Optional[CertificateStatus] = None,
     expiring_soon: Optional[bool] = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """List all certificates with filters"""
-    query = select(Certificate).options(selectinload(Certificate.asset))
+    """List all certificates with filters (keyset pagination, next cursor in X-Next-Cursor)"""
+    # Responses only carry asset_id, so the asset relationship is not loaded,
+    # and only the response columns are fetched (no signature or extra_data)
+    query = select(Certificate).options(
+        load_only(*CERTIFICATE_RESPONSE_COLUMNS, raiseload=True)
+    )
     
     # Filter by company via asset
     if current_user.role != UserRole.SUPER_ADMIN and current_user.company_id:
@@ -54,66 +93,45 @@ async def list_certificates(
     if status:
         query = query.where(Certificate.status == status)
     
-    # Expiring soon filter
+    # Expiring soon filter (single range on ix_certificates_expiry_issued)
     if expiring_soon:
-        soon_date = date.today() + timedelta(days=30)
+        today = date.today()
         query = query.where(
-            Certificate.expiry_date <= soon_date,
-            Certificate.expiry_date >= date.today(),
-            Certificate.status == CertificateStatus.ISSUED
+            Certificate.status == CertificateStatus.ISSUED,
+            Certificate.expiry_date.between(today, today + timedelta(days=30))
         )
     
-    # Pagination
-    offset = (page - 1) * page_size
-    query = query.offset(offset).limit(page_size).order_by(Certificate.created_at.desc())
+    # Keyset pagination: continue after the last row of the previous page
+    after = decode_cursor(cursor)
+    if after:
+        query = query.where(tuple_(Certificate.created_at, Certificate.id) < tuple_(*after))
     
-    result = await db.execute(query)
-    certificates = result.scalars().all()
+    # Fetch one extra row to detect whether another page exists
+    query = query.order_by(Certificate.created_at.desc(), Certificate.id.desc()).limit(limit + 1)
     
-    # Add computed properties
-    cert_responses = []
-    for cert in certificates:
-        response = CertificateResponse.model_validate(cert)
-        response.is_valid = cert.is_valid
-        response.days_until_expiry = cert.days_until_expiry
-        cert_responses.append(response)
+    result = await db.execute(query)
+    certificates, next_cursor = split_page(result.scalars().all(), limit)
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
     
-    return cert_responses
+    # Rows come straight from the database: build the schemas without validation
+    # and skip response_model (computed fields are still included in the dump)
+    return orm_json(CertificateResponse, certificates, headers=headers)
 
 
-@router.post("/generate", response_model=CertificateResponse, status_code=status.HTTP_201_CREATED)
+@router.post("/generate", response_model=CertificateResponse, status_code=status.HTTP_202_ACCEPTED)
 async def generate_certificate(
     request: CertificateGenerateRequest,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(require_inspector),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Generate a new certificate for an asset
     This is the "Auto-PDF Report" feature
+    The PDF is rendered in the background; poll /{certificate_id}/pdf-status
     """
-    # Verify asset exists
-    result = await db.execute(
-        select(Asset).where(
-            Asset.id == request.asset_id,
-            Asset.is_deleted == False
-        )
-    )
-    asset = result.scalar_one_or_none()
-    
-    if not asset:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Asset not found"
-        )
-    
-    if (
-        current_user.role != UserRole.SUPER_ADMIN 
-        and asset.company_id != current_user.company_id
-    ):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
-        )
+    # Verify asset exists and user has access
+    asset = await fetch_accessible_asset(db, current_user, Asset.id == request.asset_id)
     
     # Verify test if provided
     test = None
@@ -128,9 +146,6 @@ async def generate_certificate(
                 detail="Test not found"
             )
     
-    # Generate certificate number
-    cert_number = await generate_certificate_number(db)
-    
     # Calculate dates
     issue_date = date.today()
     expiry_date = issue_date + timedelta(days=request.validity_days)
@@ -138,7 +153,6 @@ async def generate_certificate(
     # Create certificate record
     certificate = Certificate(
         asset_id=request.asset_id,
-        certificate_number=cert_number,
         certificate_type=request.certificate_type,
         issue_date=issue_date,
         expiry_date=expiry_date,
@@ -148,29 +162,23 @@ async def generate_certificate(
         inspector_certification=request.inspector_certification,
         notes=request.notes,
         signed_by=current_user.full_name,
-        signed_at=datetime.utcnow(),
+        signed_at=datetime.now(timezone.utc),
     )
     
     db.add(certificate)
-    await db.flush()
-    
-    # Generate PDF
-    pdf_url = await generate_certificate_pdf(certificate, asset, test, db)
-    certificate.pdf_url = pdf_url
     
     # Update asset certificate expiry
     asset.certificate_expiry_date = expiry_date
     asset.last_inspection_date = issue_date
     asset.next_inspection_date = expiry_date - timedelta(days=30)
     
+    # One flush: INSERT ... RETURNING certificate_number, then the asset UPDATE
     await db.flush()
-    await db.refresh(certificate)
     
-    response = CertificateResponse.model_validate(certificate)
-    response.is_valid = certificate.is_valid
-    response.days_until_expiry = certificate.days_until_expiry
+    # Render the PDF after the response is sent (and the certificate committed)
+    background_tasks.add_task(render_certificate_pdf, certificate.id)
     
-    return response
+    return certificate
 
 
 @router.get("/{certificate_id}", response_model=CertificateResponse)
@@ -180,34 +188,57 @@ async def get_certificate(
     db: AsyncSession = Depends(get_db)
 ):
     """Get certificate by ID"""
-    result = await db.execute(
-        select(Certificate)
-        .options(selectinload(Certificate.asset))
-        .where(Certificate.id == certificate_id)
+    # Company access is checked in SQL (other companies' rows are a 404)
+    certificate = await fetch_company_record(
+        db, current_user, Certificate, Certificate.id == certificate_id, detail="Certificate not found"
     )
-    certificate = result.scalar_one_or_none()
     
-    if not certificate:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Certificate not found"
-        )
+    return certificate
+
+
+@router.get("/{certificate_id}/pdf-status")
+async def get_certificate_pdf_status(
+    certificate_id: uuid.UUID,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Check whether a certificate's PDF has been rendered (status: pending, ready or failed)"""
+    # Company access is checked in SQL (other companies' rows are a 404)
+    certificate = await fetch_company_record(
+        db, current_user, Certificate, Certificate.id == certificate_id, detail="Certificate not found"
+    )
     
-    # Check company access via asset
-    if (
-        current_user.role != UserRole.SUPER_ADMIN 
-        and certificate.asset.company_id != current_user.company_id
-    ):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
-        )
+    return _pdf_status(certificate)
+
+
+@router.post("/{certificate_id}/render-pdf", status_code=status.HTTP_202_ACCEPTED)
+async def retry_certificate_pdf(
+    certificate_id: uuid.UUID,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(require_inspector),
+    db: AsyncSession = Depends(get_db)
+):
+    """Queue the PDF render again after a failure (pending or ready PDFs are left alone)"""
+    certificate = await fetch_company_record(
+        db, current_user, Certificate, Certificate.id == certificate_id, detail="Certificate not found"
+    )
     
-    response = CertificateResponse.model_validate(certificate)
-    response.is_valid = certificate.is_valid
-    response.days_until_expiry = certificate.days_until_expiry
+    # Clearing the error (back to pending) claims the retry: of concurrent retries
+    # only the first UPDATE still matches once the row lock is released
+    claimed = await db.scalar(
+        update(Certificate)
+        .where(
+            Certificate.id == certificate.id,
+            Certificate.pdf_url.is_(None),
+            Certificate.pdf_error.is_not(None),
+        )
+        .values(pdf_error=None)
+        .returning(Certificate.id)
+    )
+    if claimed:
+        background_tasks.add_task(render_certificate_pdf, certificate.id)
     
-    return response
+    return _pdf_status(certificate)
 
 
 @router.get("/{certificate_id}/download")
@@ -217,80 +248,59 @@ async def download_certificate_pdf(
     db: AsyncSession = Depends(get_db)
 ):
     """Download certificate PDF"""
-    result = await db.execute(
-        select(Certificate)
-        .options(selectinload(Certificate.asset))
-        .where(Certificate.id == certificate_id)
+    # Company access is checked in SQL (other companies' rows are a 404)
+    certificate = await fetch_company_record(
+        db, current_user, Certificate, Certificate.id == certificate_id, detail="Certificate not found"
     )
-    certificate = result.scalar_one_or_none()
     
-    if not certificate:
+    if not certificate.pdf_url:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Certificate not found"
+            detail="PDF not available"
         )
     
-    # Check company access
-    if (
-        current_user.role != UserRole.SUPER_ADMIN 
-        and certificate.asset.company_id != current_user.company_id
-    ):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
-        )
+    filename = f"Certificate_{certificate.certificate_number}.pdf"
     
-    if not certificate.pdf_url:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="PDF not available"
+    # Let nginx send the file from disk when it fronts the API
+    if settings.pdf_accel_redirect_prefix:
+        return Response(
+            media_type="application/pdf",
+            headers={
+                "X-Accel-Redirect": settings.pdf_accel_redirect_prefix + os.path.basename(certificate.pdf_url),
+                "Content-Disposition": f'attachment; filename="{filename}"',
+            },
         )
     
     # Return PDF file
     return FileResponse(
         certificate.pdf_url,
         media_type="application/pdf",
-        filename=f"Certificate_{certificate.certificate_number}.pdf"
+        filename=filename
     )
 
 
 @router.post("/{certificate_id}/revoke", response_model=CertificateResponse)
 async def revoke_certificate(
     certificate_id: uuid.UUID,
+    background_tasks: BackgroundTasks,
     reason: Optional[str] = None,
     current_user: User = Depends(require_inspector),
     db: AsyncSession = Depends(get_db)
 ):
     """Revoke a certificate"""
-    result = await db.execute(
-        select(Certificate)
-        .options(selectinload(Certificate.asset))
-        .where(Certificate.id == certificate_id)
+    # Company access is checked in SQL (other companies' rows are a 404)
+    certificate = await fetch_company_record(
+        db, current_user, Certificate, Certificate.id == certificate_id, detail="Certificate not found"
     )
-    certificate = result.scalar_one_or_none()
-    
-    if not certificate:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Certificate not found"
-        )
-    
-    # Check company access
-    if (
-        current_user.role != UserRole.SUPER_ADMIN 
-        and certificate.asset.company_id != current_user.company_id
-    ):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
-        )
     
     certificate.status = CertificateStatus.REVOKED
     if reason:
         certificate.notes = f"{certificate.notes or ''}\nRevoked: {reason}"
     
     await db.flush()
-    await db.refresh(certificate)
+    
+    # Drop the cached verification once the revocation is committed
+    background_tasks.add_task(cache_delete, _verify_cache_key(certificate.certificate_number))
     
     return certificate
 
@@ -304,12 +314,29 @@ async def verify_certificate(
     Public endpoint to verify certificate authenticity
     No authentication required - for external verification
     """
+    cache_key = _verify_cache_key(certificate_number)
+    cached = await cache_get(cache_key)
+    if cached:
+        return Response(content=cached, media_type="application/json")
+    
+    # Project only the printed columns; certificates stay verifiable after
+    # their asset is soft-deleted
     result = await db.execute(
-        select(Certificate)
-        .options(selectinload(Certificate.asset))
+        select(
+            Certificate.certificate_number,
+            Certificate.issue_date,
+            Certificate.expiry_date,
+            Certificate.status,
+            Certificate.is_valid.label("is_valid"),
+            Certificate.days_until_expiry.label("days_until_expiry"),
+            Asset.name.label("asset_name"),
+            Asset.asset_code,
+        )
+        .join(Asset, Certificate.asset_id == Asset.id)
         .where(Certificate.certificate_number == certificate_number)
+        .execution_options(include_deleted=True)
     )
-    certificate = result.scalar_one_or_none()
+    certificate = result.first()
     
     if not certificate:
         return {
@@ -317,17 +344,22 @@ async def verify_certificate(
             "message": "Certificate not found"
         }
     
+    # Validity and remaining days come from the Certificate hybrids, computed in SQL
     is_valid = certificate.is_valid
     
-    return {
+    payload = {
         "valid": is_valid,
         "certificate_number": certificate.certificate_number,
-        "asset_name": certificate.asset.name,
-        "asset_code": certificate.asset.asset_code,
-        "issue_date": certificate.issue_date.isoformat(),
-        "expiry_date": certificate.expiry_date.isoformat(),
+        "asset_name": certificate.asset_name,
+        "asset_code": certificate.asset_code,
+        "issue_date": certificate.issue_date,
+        "expiry_date": certificate.expiry_date,
         "status": certificate.status.value,
         "days_until_expiry": certificate.days_until_expiry if is_valid else 0,
         "message": "Certificate is valid" if is_valid else f"Certificate status: {certificate.status.value}"
     }
+    
+    await cache_set(cache_key, orjson.dumps(payload).decode(), VERIFY_CACHE_TTL)
+    
+    return payload
 
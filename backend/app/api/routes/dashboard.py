@@ -3,17 +3,18 @@ Dashboard Routes
 Analytics and summary data
 """
 from datetime import date, timedelta
+from dateutil.relativedelta import relativedelta
 from typing import Optional
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, and_
 
 from app.database import get_db
-from app.models.user import User, UserRole
+from app.models.user import User
 from app.models.asset import Asset, AssetStatus, AssetCategory
 from app.models.certificate import Certificate, CertificateStatus
 from app.models.test import Test, TestStatus, TestResult
-from app.api.deps import get_current_user
+from app.api.deps import get_current_user, company_scope
 
 router = APIRouter()
 
@@ -24,74 +25,48 @@ async def get_dashboard_summary(
     db: AsyncSession = Depends(get_db)
 ):
     """Get dashboard summary statistics"""
-    company_filter = True
-    if current_user.role != UserRole.SUPER_ADMIN and current_user.company_id:
-        company_filter = Asset.company_id == current_user.company_id
-    
-    # Total assets
-    total_assets = await db.execute(
-        select(func.count(Asset.id)).where(
-            Asset.is_deleted == False,
-            company_filter
-        )
-    )
-    total_assets_count = total_assets.scalar() or 0
-    
-    # Active assets
-    active_assets = await db.execute(
-        select(func.count(Asset.id)).where(
-            Asset.is_deleted == False,
-            Asset.status == AssetStatus.ACTIVE,
-            company_filter
-        )
-    )
-    active_assets_count = active_assets.scalar() or 0
-    
-    # Expiring certificates (within 30 days)
-    soon_date = date.today() + timedelta(days=30)
-    expiring_certs = await db.execute(
-        select(func.count(Asset.id)).where(
-            Asset.is_deleted == False,
-            Asset.certificate_expiry_date <= soon_date,
-            Asset.certificate_expiry_date >= date.today(),
-            company_filter
-        )
-    )
-    expiring_count = expiring_certs.scalar() or 0
-    
-    # Expired certificates
-    expired_certs = await db.execute(
-        select(func.count(Asset.id)).where(
-            Asset.is_deleted == False,
-            Asset.certificate_expiry_date < date.today(),
-            company_filter
+    company_filter = company_scope(current_user)
+    
+    today = date.today()
+    soon_date = today + timedelta(days=30)
+    month_start = today.replace(day=1)
+    
+    # Asset counters in one pass (conditional aggregates)
+    asset_counts = await db.execute(
+        select(
+            func.count().label("total"),
+            func.count().filter(
+                Asset.status == AssetStatus.ACTIVE
+            ).label("active"),
+            # Expiring certificates (within 30 days)
+            func.count().filter(
+                Asset.certificate_expiry_date.between(today, soon_date)
+            ).label("expiring"),
+            func.count().filter(
+                Asset.certificate_expiry_date < today
+            ).label("expired"),
         )
+        .select_from(Asset)
+        .where(company_filter)
     )
-    expired_count = expired_certs.scalar() or 0
-    
-    # Tests this month
-    month_start = date.today().replace(day=1)
-    tests_this_month = await db.execute(
-        select(func.count(Test.id))
-        .join(Asset)
-        .where(
-            Test.created_at >= month_start,
-            company_filter
+    total_assets_count, active_assets_count, expiring_count, expired_count = asset_counts.one()
+    
+    # Tests and passes this month in one pass
+    test_counts = await db.execute(
+        select(
+            func.count().label("total"),
+            func.count().filter(
+                Test.result == TestResult.PASS
+            ).label("passed"),
         )
-    )
-    tests_count = tests_this_month.scalar() or 0
-    
-    # Pass rate this month
-    passed_tests = await db.execute(
-        select(func.count(Test.id))
+        .select_from(Test)
         .join(Asset)
         .where(
             Test.created_at >= month_start,
-            Test.result == TestResult.PASS,
             company_filter
         )
     )
-    passed_count = passed_tests.scalar() or 0
+    tests_count, passed_count = test_counts.one()
     pass_rate = (passed_count / tests_count * 100) if tests_count > 0 else 0
     
     return {
@@ -111,13 +86,11 @@ async def get_assets_by_category(
     db: AsyncSession = Depends(get_db)
 ):
     """Get asset count by category"""
-    company_filter = True
-    if current_user.role != UserRole.SUPER_ADMIN and current_user.company_id:
-        company_filter = Asset.company_id == current_user.company_id
+    company_filter = company_scope(current_user)
     
     result = await db.execute(
-        select(Asset.category, func.count(Asset.id))
-        .where(Asset.is_deleted == False, company_filter)
+        select(Asset.category, func.count())
+        .where(company_filter)
         .group_by(Asset.category)
     )
     
@@ -137,13 +110,11 @@ async def get_assets_by_status(
     db: AsyncSession = Depends(get_db)
 ):
     """Get asset count by status"""
-    company_filter = True
-    if current_user.role != UserRole.SUPER_ADMIN and current_user.company_id:
-        company_filter = Asset.company_id == current_user.company_id
+    company_filter = company_scope(current_user)
     
     result = await db.execute(
-        select(Asset.status, func.count(Asset.id))
-        .where(Asset.is_deleted == False, company_filter)
+        select(Asset.status, func.count())
+        .where(company_filter)
         .group_by(Asset.status)
     )
     
@@ -166,8 +137,7 @@ async def get_recent_tests(
     """Get recent tests"""
     query = select(Test).join(Asset)
     
-    if current_user.role != UserRole.SUPER_ADMIN and current_user.company_id:
-        query = query.where(Asset.company_id == current_user.company_id)
+    query = query.where(company_scope(current_user))
     
     query = query.order_by(Test.created_at.desc()).limit(limit)
     
@@ -177,13 +147,13 @@ async def get_recent_tests(
     return {
         "tests": [
             {
-                "id": str(test.id),
+                "id": test.id,
                 "test_number": test.test_number,
-                "asset_id": str(test.asset_id),
+                "asset_id": test.asset_id,
                 "test_type": test.test_type.value,
                 "result": test.result.value,
                 "status": test.status.value,
-                "created_at": test.created_at.isoformat(),
+                "created_at": test.created_at,
             }
             for test in tests
         ]
@@ -198,37 +168,28 @@ async def get_expiring_assets(
     db: AsyncSession = Depends(get_db)
 ):
     """Get assets with expiring certificates"""
-    soon_date = date.today() + timedelta(days=days)
-    
-    query = select(Asset).where(
-        Asset.is_deleted == False,
-        Asset.certificate_expiry_date <= soon_date,
-        Asset.certificate_expiry_date >= date.today()
+    today = date.today()
+    
+    # Plain column rows (no ORM hydration); days left is computed in SQL
+    query = select(
+        Asset.id,
+        Asset.asset_code,
+        Asset.name,
+        Asset.category,
+        Asset.asset_type,
+        Asset.certificate_expiry_date,
+        (Asset.certificate_expiry_date - today).label("days_until_expiry"),
+        Asset.location,
+    ).where(
+        Asset.certificate_expiry_date.between(today, today + timedelta(days=days)),
+        company_scope(current_user)
     )
     
-    if current_user.role != UserRole.SUPER_ADMIN and current_user.company_id:
-        query = query.where(Asset.company_id == current_user.company_id)
-    
     query = query.order_by(Asset.certificate_expiry_date.asc()).limit(limit)
     
     result = await db.execute(query)
-    assets = result.scalars().all()
     
-    return {
-        "assets": [
-            {
-                "id": str(asset.id),
-                "asset_code": asset.asset_code,
-                "name": asset.name,
-                "category": asset.category.value,
-                "asset_type": asset.asset_type.value,
-                "certificate_expiry_date": asset.certificate_expiry_date.isoformat() if asset.certificate_expiry_date else None,
-                "days_until_expiry": (asset.certificate_expiry_date - date.today()).days if asset.certificate_expiry_date else None,
-                "location": asset.location,
-            }
-            for asset in assets
-        ]
-    }
+    return {"assets": [dict(row) for row in result.mappings()]}
 
 
 @router.get("/test-trends")
@@ -238,49 +199,42 @@ async def get_test_trends(
     db: AsyncSession = Depends(get_db)
 ):
     """Get test trends over time"""
-    trends = []
-    
-    for i in range(months - 1, -1, -1):
-        # Calculate month start and end
-        today = date.today()
-        month_date = today.replace(day=1) - timedelta(days=i * 30)
-        month_start = month_date.replace(day=1)
-        if month_date.month == 12:
-            month_end = month_date.replace(year=month_date.year + 1, month=1, day=1) - timedelta(days=1)
-        else:
-            month_end = month_date.replace(month=month_date.month + 1, day=1) - timedelta(days=1)
-        
-        # Count tests
-        query = select(func.count(Test.id)).join(Asset).where(
-            Test.created_at >= month_start,
-            Test.created_at <= month_end
-        )
-        
-        if current_user.role != UserRole.SUPER_ADMIN and current_user.company_id:
-            query = query.where(Asset.company_id == current_user.company_id)
-        
-        result = await db.execute(query)
-        count = result.scalar() or 0
-        
-        # Count passed
-        passed_query = select(func.count(Test.id)).join(Asset).where(
-            Test.created_at >= month_start,
-            Test.created_at <= month_end,
-            Test.result == TestResult.PASS
+    # Window starts on the first day of the oldest month shown
+    current_month = date.today().replace(day=1)
+    window_start = current_month - relativedelta(months=months - 1)
+    
+    month = func.date_trunc("month", Test.created_at).label("month")
+    query = (
+        select(
+            month,
+            func.count().label("total"),
+            func.count().filter(Test.result == TestResult.PASS).label("passed"),
         )
-        
-        if current_user.role != UserRole.SUPER_ADMIN and current_user.company_id:
-            passed_query = passed_query.where(Asset.company_id == current_user.company_id)
-        
-        passed_result = await db.execute(passed_query)
-        passed = passed_result.scalar() or 0
-        
+        .select_from(Test)
+        .join(Asset)
+        .where(Test.created_at >= window_start)
+    )
+    
+    query = query.where(company_scope(current_user))
+    
+    query = query.group_by(month).order_by(month)
+    
+    result = await db.execute(query)
+    counts = {
+        row.month.strftime("%Y-%m"): (row.total, row.passed)
+        for row in result.all()
+    }
+    
+    # Fill in months without tests
+    trends = []
+    for i in range(months):
+        key = (window_start + relativedelta(months=i)).strftime("%Y-%m")
+        count, passed = counts.get(key, (0, 0))
         trends.append({
-            "month": month_start.strftime("%Y-%m"),
+            "month": key,
             "total": count,
             "passed": passed,
             "failed": count - passed,
         })
     
     return {"trends": trends}
-
@@ -3,12 +3,12 @@ Test Routes
 Equipment Testing and Examination
 """
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional, List
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, func, tuple_
+from sqlalchemy.orm import load_only
 
 from app.database import get_db
 from app.models.user import User, UserRole
@@ -17,24 +17,34 @@ from app.models.test import Test, TestStatus, TestResult, TestType
 from app.schemas.test import (
     TestCreate, TestUpdate, TestResponse, TestSubmit, TestValidation
 )
-from app.api.deps import get_current_user, require_inspector
+from app.api.deps import (
+    get_current_user, require_inspector, check_asset_access,
+    fetch_accessible_asset, fetch_company_record
+)
+from app.api.pagination import NEXT_CURSOR_HEADER, decode_cursor, split_page
+from app.api.responses import orm_json
 from app.services.test_service import validate_test_result, generate_test_number
 
 router = APIRouter()
 
+# Columns loaded for list_tests (exactly the TestResponse fields)
+TEST_RESPONSE_COLUMNS = tuple(getattr(Test, name) for name in TestResponse.model_fields)
+
 
 @router.get("", response_model=List[TestResponse])
 async def list_tests(
-    page: int = Query(1, ge=1),
-    page_size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
     asset_id: Optional[uuid.UUID] = None,
     status: Optional[TestStatus] = None,
     result: Optional[TestResult] = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """List all tests with filters"""
-    query = select(Test).options(selectinload(Test.asset))
+    """List all tests with filters (keyset pagination, next cursor in X-Next-Cursor)"""
+    # Responses only carry asset_id, so the asset relationship is not loaded,
+    # and only the response columns are fetched (no sensor payloads or extra_data)
+    query = select(Test).options(load_only(*TEST_RESPONSE_COLUMNS, raiseload=True))
     
     # Filter by company via asset
     if current_user.role != UserRole.SUPER_ADMIN and current_user.company_id:
@@ -52,14 +62,21 @@ async def list_tests(
     if result:
         query = query.where(Test.result == result)
     
-    # Pagination
-    offset = (page - 1) * page_size
-    query = query.offset(offset).limit(page_size).order_by(Test.created_at.desc())
+    # Keyset pagination: continue after the last row of the previous page
+    after = decode_cursor(cursor)
+    if after:
+        query = query.where(tuple_(Test.created_at, Test.id) < tuple_(*after))
+    
+    # Fetch one extra row to detect whether another page exists
+    query = query.order_by(Test.created_at.desc(), Test.id.desc()).limit(limit + 1)
     
     db_result = await db.execute(query)
-    tests = db_result.scalars().all()
+    tests, next_cursor = split_page(db_result.scalars().all(), limit)
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
     
-    return tests
+    # Rows come straight from the database: build the schemas without validation
+    # and skip response_model
+    return orm_json(TestResponse, tests, headers=headers)
 
 
 @router.post("", response_model=TestResponse, status_code=status.HTTP_201_CREATED)
@@ -70,28 +87,7 @@ async def create_test(
 ):
     """Create a new test/examination"""
     # Verify asset exists and user has access
-    result = await db.execute(
-        select(Asset).where(
-            Asset.id == test_data.asset_id,
-            Asset.is_deleted == False
-        )
-    )
-    asset = result.scalar_one_or_none()
-    
-    if not asset:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Asset not found"
-        )
-    
-    if (
-        current_user.role != UserRole.SUPER_ADMIN 
-        and asset.company_id != current_user.company_id
-    ):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
-        )
+    await fetch_accessible_asset(db, current_user, Asset.id == test_data.asset_id)
     
     # Generate test number
     test_number = await generate_test_number(db)
@@ -114,7 +110,6 @@ async def create_test(
     
     db.add(test)
     await db.flush()
-    await db.refresh(test)
     
     return test
 
@@ -129,53 +124,35 @@ async def submit_test_results(
     Submit test results from field (QR scan workflow)
     This is the main endpoint for field inspectors
     """
-    asset_id = test_data.asset_id
+    asset = None
     
-    # If QR data provided, get asset from QR
+    # If QR data provided, get asset from QR (reused below, no second lookup)
     if test_data.qr_data:
         result = await db.execute(
             select(Asset).where(
-                Asset.qr_data == test_data.qr_data,
-                Asset.is_deleted == False
+                Asset.qr_data == test_data.qr_data
             )
         )
         asset = result.scalar_one_or_none()
-        if asset:
-            asset_id = asset.id
     
-    if not asset_id:
+    if asset:
+        check_asset_access(current_user, asset)
+    elif test_data.asset_id:
+        asset = await fetch_accessible_asset(db, current_user, Asset.id == test_data.asset_id)
+    else:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Asset ID or valid QR data required"
         )
     
-    # Verify asset exists
-    result = await db.execute(
-        select(Asset).where(
-            Asset.id == asset_id,
-            Asset.is_deleted == False
-        )
-    )
-    asset = result.scalar_one_or_none()
-    
-    if not asset:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Asset not found"
-        )
-    
-    if (
-        current_user.role != UserRole.SUPER_ADMIN 
-        and asset.company_id != current_user.company_id
-    ):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
-        )
+    asset_id = asset.id
     
     # Generate test number
     test_number = await generate_test_number(db)
     
+    # One timezone-aware timestamp for the whole field submission
+    now = datetime.now(timezone.utc)
+    
     # Create test record
     test = Test(
         test_number=test_number,
@@ -195,9 +172,9 @@ async def submit_test_results(
         sensor_id=test_data.sensor_id,
         sensor_data=test_data.sensor_data,
         scanned_qr_data=test_data.qr_data,
-        scan_timestamp=datetime.utcnow(),
-        started_at=datetime.utcnow(),
-        completed_at=datetime.utcnow(),
+        scan_timestamp=now,
+        started_at=now,
+        completed_at=now,
         status=TestStatus.COMPLETED,
     )
     
@@ -206,14 +183,13 @@ async def submit_test_results(
     test.result = validation_result["result"]
     test.is_validated = True
     test.validated_by = "System Auto-Validation"
-    test.validated_at = datetime.utcnow()
+    test.validated_at = now
     
     db.add(test)
     await db.flush()
-    await db.refresh(test)
     
     # Update asset inspection dates
-    asset.last_inspection_date = datetime.utcnow().date()
+    asset.last_inspection_date = now.date()
     await db.flush()
     
     return TestValidation(
@@ -232,28 +208,10 @@ async def get_test(
     db: AsyncSession = Depends(get_db)
 ):
     """Get test by ID"""
-    result = await db.execute(
-        select(Test)
-        .options(selectinload(Test.asset))
-        .where(Test.id == test_id)
+    # Company access is checked in SQL (other companies' rows are a 404)
+    test = await fetch_company_record(
+        db, current_user, Test, Test.id == test_id, detail="Test not found"
     )
-    test = result.scalar_one_or_none()
-    
-    if not test:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Test not found"
-        )
-    
-    # Check company access via asset
-    if (
-        current_user.role != UserRole.SUPER_ADMIN 
-        and test.asset.company_id != current_user.company_id
-    ):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
-        )
     
     return test
 
@@ -266,28 +224,10 @@ async def update_test(
     db: AsyncSession = Depends(get_db)
 ):
     """Update test"""
-    result = await db.execute(
-        select(Test)
-        .options(selectinload(Test.asset))
-        .where(Test.id == test_id)
+    # Company access is checked in SQL (other companies' rows are a 404)
+    test = await fetch_company_record(
+        db, current_user, Test, Test.id == test_id, detail="Test not found"
     )
-    test = result.scalar_one_or_none()
-    
-    if not test:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Test not found"
-        )
-    
-    # Check company access
-    if (
-        current_user.role != UserRole.SUPER_ADMIN 
-        and test.asset.company_id != current_user.company_id
-    ):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
-        )
     
     update_data = test_data.model_dump(exclude_unset=True)
     
@@ -295,7 +235,6 @@ async def update_test(
         setattr(test, field, value)
     
     await db.flush()
-    await db.refresh(test)
     
     return test
 
@@ -307,38 +246,19 @@ async def validate_test(
     db: AsyncSession = Depends(get_db)
 ):
     """Manually trigger test validation"""
-    result = await db.execute(
-        select(Test)
-        .options(selectinload(Test.asset))
-        .where(Test.id == test_id)
+    # Company access is checked in SQL (other companies' rows are a 404)
+    test = await fetch_company_record(
+        db, current_user, Test, Test.id == test_id, detail="Test not found"
     )
-    test = result.scalar_one_or_none()
-    
-    if not test:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Test not found"
-        )
-    
-    # Check company access
-    if (
-        current_user.role != UserRole.SUPER_ADMIN 
-        and test.asset.company_id != current_user.company_id
-    ):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
-        )
     
     # Run validation
     validation_result = validate_test_result(test)
     test.result = validation_result["result"]
     test.is_validated = True
     test.validated_by = current_user.full_name
-    test.validated_at = datetime.utcnow()
+    test.validated_at = datetime.now(timezone.utc)
     
     await db.flush()
-    await db.refresh(test)
     
     return TestValidation(
         test_id=test.id,
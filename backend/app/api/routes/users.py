@@ -1,19 +1,54 @@
 """
 User Routes
 """
-from typing import List
+from typing import List, Optional
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, status
+import orjson
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update, delete, true, lambda_stmt, tuple_
 
 from app.database import get_db
 from app.models.user import User, UserRole
 from app.schemas.user import UserResponse, UserUpdate
-from app.api.deps import get_current_user, require_admin
+from app.cache import cache_get, cache_set
+from app.api.deps import (
+    get_current_user, require_admin, invalidate_user_cache, set_user_revoked,
+    invalidate_user_list_cache, USER_LIST_CACHE_TAG, USER_LIST_CACHE_TTL
+)
+from app.api.pagination import NEXT_CURSOR_HEADER, decode_cursor, split_page
 
 router = APIRouter()
 
+# Columns selected for list_users (exactly the UserResponse fields)
+USER_RESPONSE_COLUMNS = tuple(getattr(User, name) for name in UserResponse.model_fields)
+
+
+def _user_scope(current_user: User):
+    """
+    WHERE criterion limiting company admins to users of their own company
+    Users outside the scope are indistinguishable from missing ones (404)
+    """
+    if current_user.role == UserRole.COMPANY_ADMIN:
+        return User.company_id == current_user.company_id
+    return true()
+
+
+async def _update_user_row(db: AsyncSession, update_data: dict, *criteria) -> User:
+    """Apply update_data with a single UPDATE ... RETURNING (plain SELECT if nothing changes)"""
+    if update_data:
+        stmt = update(User).where(*criteria).values(**update_data).returning(User)
+    else:
+        stmt = select(User).where(*criteria)
+    result = await db.execute(stmt)
+    return result.scalar_one_or_none()
+
+
+def _user_page_response(body: str, next_cursor: Optional[str]) -> Response:
+    """JSON response for a page of users, with the next cursor header if there is one"""
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return Response(content=body, media_type="application/json", headers=headers)
+
 
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_info(
@@ -26,6 +61,7 @@ async def get_current_user_info(
 @router.put("/me", response_model=UserResponse)
 async def update_current_user(
     user_data: UserUpdate,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -36,34 +72,71 @@ async def update_current_user(
     if "role" in update_data:
         del update_data["role"]
     
-    for field, value in update_data.items():
-        setattr(current_user, field, value)
+    # current_user may be a cached snapshot; update the row directly
+    user = await _update_user_row(db, update_data, User.id == current_user.id)
     
-    await db.flush()
-    await db.refresh(current_user)
+    if not user:
+        # Account deleted since the snapshot was cached; drop it so the token stops resolving
+        await invalidate_user_cache(current_user.id)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     
-    return current_user
+    # Cached auth entries and listings are dropped once the change is committed
+    background_tasks.add_task(invalidate_user_cache, user.id)
+    background_tasks.add_task(invalidate_user_list_cache)
+    if "is_active" in update_data:
+        background_tasks.add_task(set_user_revoked, user.id, not user.is_active)
+    
+    return user
 
 
 @router.get("", response_model=List[UserResponse])
 async def list_users(
-    skip: int = 0,
-    limit: int = 100,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=100),
     current_user: User = Depends(require_admin),
     db: AsyncSession = Depends(get_db)
 ):
-    """List all users (admin only)"""
-    query = select(User)
+    """
+    List all users (admin only, keyset pagination, next cursor in X-Next-Cursor)
+    Pages are cached briefly per company, cursor and limit
+    """
+    # Company admins only ever see their own company, super admins see everyone
+    scope = current_user.company_id if current_user.role == UserRole.COMPANY_ADMIN else "all"
+    cache_key = f"{USER_LIST_CACHE_TAG}:{scope}:{cursor or ''}:{limit}"
+    cached = await cache_get(cache_key)
+    if cached:
+        # Cached as "<next cursor>\n<JSON body>"
+        next_cursor, body = cached.split("\n", 1)
+        return _user_page_response(body, next_cursor)
+    
+    # Select the response columns only; rows come straight from the database,
+    # so they are encoded as-is without building or validating UserResponse objects
+    query = select(*USER_RESPONSE_COLUMNS)
     
     # Filter by company for company admins
-    if current_user.role == UserRole.COMPANY_ADMIN:
-        query = query.where(User.company_id == current_user.company_id)
+    query = query.where(_user_scope(current_user))
+    
+    # Keyset pagination: continue after the last row of the previous page
+    after = decode_cursor(cursor)
+    if after:
+        query = query.where(tuple_(User.created_at, User.id) < tuple_(*after))
+    
+    # Fetch one extra row to detect whether another page exists
+    query = query.order_by(User.created_at.desc(), User.id.desc()).limit(limit + 1)
     
-    query = query.offset(skip).limit(limit)
     result = await db.execute(query)
-    users = result.scalars().all()
+    rows, next_cursor = split_page(result.all(), limit)
     
-    return users
+    body = orjson.dumps([dict(row._mapping) for row in rows]).decode()
+    await cache_set(
+        cache_key, f"{next_cursor or ''}\n{body}", USER_LIST_CACHE_TTL, tag=USER_LIST_CACHE_TAG
+    )
+    
+    return _user_page_response(body, next_cursor)
 
 
 @router.get("/{user_id}", response_model=UserResponse)
@@ -73,10 +146,13 @@ async def get_user(
     db: AsyncSession = Depends(get_db)
 ):
     """Get user by ID (admin only)"""
-    result = await db.execute(
-        select(User).where(User.id == user_id)
-    )
-    user = result.scalar_one_or_none()
+    # Lambda statements are built and cache-keyed once per call site;
+    # only the response columns are read (never hashed_password)
+    scope = _user_scope(current_user)
+    stmt = lambda_stmt(lambda: select(*USER_RESPONSE_COLUMNS).where(User.id == user_id))
+    stmt += lambda s: s.where(scope)
+    result = await db.execute(stmt)
+    user = result.mappings().one_or_none()
     
     if not user:
         raise HTTPException(
@@ -84,31 +160,24 @@ async def get_user(
             detail="User not found"
         )
     
-    # Company admins can only see users in their company
-    if (
-        current_user.role == UserRole.COMPANY_ADMIN 
-        and user.company_id != current_user.company_id
-    ):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
-        )
-    
-    return user
+    return dict(user)
 
 
 @router.put("/{user_id}", response_model=UserResponse)
 async def update_user(
     user_id: UUID,
+    background_tasks: BackgroundTasks,
     user_data: UserUpdate,
     current_user: User = Depends(require_admin),
     db: AsyncSession = Depends(get_db)
 ):
     """Update user (admin only)"""
-    result = await db.execute(
-        select(User).where(User.id == user_id)
+    update_data = user_data.model_dump(exclude_unset=True)
+    
+    # Company admins can only update users in their company (checked in the WHERE)
+    user = await _update_user_row(
+        db, update_data, User.id == user_id, _user_scope(current_user)
     )
-    user = result.scalar_one_or_none()
     
     if not user:
         raise HTTPException(
@@ -116,23 +185,11 @@ async def update_user(
             detail="User not found"
         )
     
-    # Company admins can only update users in their company
-    if (
-        current_user.role == UserRole.COMPANY_ADMIN 
-        and user.company_id != current_user.company_id
-    ):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
-        )
-    
-    update_data = user_data.model_dump(exclude_unset=True)
-    
-    for field, value in update_data.items():
-        setattr(user, field, value)
-    
-    await db.flush()
-    await db.refresh(user)
+    # Cached auth entries and listings are dropped once the change is committed
+    background_tasks.add_task(invalidate_user_cache, user.id)
+    background_tasks.add_task(invalidate_user_list_cache)
+    if "is_active" in update_data:
+        background_tasks.add_task(set_user_revoked, user.id, not user.is_active)
     
     return user
 
@@ -140,38 +197,33 @@ async def update_user(
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user(
     user_id: UUID,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(require_admin),
     db: AsyncSession = Depends(get_db)
 ):
     """Delete user (admin only)"""
-    result = await db.execute(
-        select(User).where(User.id == user_id)
-    )
-    user = result.scalar_one_or_none()
-    
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-    
     # Cannot delete yourself
-    if user.id == current_user.id:
+    if user_id == current_user.id:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Cannot delete yourself"
         )
     
-    # Company admins can only delete users in their company
-    if (
-        current_user.role == UserRole.COMPANY_ADMIN 
-        and user.company_id != current_user.company_id
-    ):
+    # Company admins can only delete users in their company (checked in the WHERE);
+    # tests.inspector_id is ON DELETE SET NULL, so no ORM cascade is needed
+    deleted_id = await db.scalar(
+        delete(User)
+        .where(User.id == user_id, _user_scope(current_user))
+        .returning(User.id)
+    )
+    
+    if deleted_id is None:
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
         )
     
-    await db.delete(user)
-    await db.flush()
-
+    # Cached auth entries and listings are dropped once the change is committed
+    background_tasks.add_task(invalidate_user_cache, user_id)
+    background_tasks.add_task(invalidate_user_list_cache)
+    background_tasks.add_task(set_user_revoked, user_id, True)
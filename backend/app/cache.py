@@ -0,0 +1,82 @@
+"""
+CertiTrack Cache Configuration
+Shared async Redis client for short-lived caches
+"""
+from typing import Optional
+
+from redis.asyncio import Redis, from_url
+from redis.exceptions import RedisError
+
+from app.config import settings
+
+# Create shared client (connection pool is opened lazily on first command)
+redis_client: Redis = from_url(
+    settings.redis_url,
+    decode_responses=True,
+    max_connections=20,
+)
+
+
+async def cache_get(key: str) -> Optional[str]:
+    """Get a cached value, treating Redis errors as a miss"""
+    try:
+        return await redis_client.get(key)
+    except RedisError:
+        return None
+
+
+async def cache_set(key: str, value: str, ttl: int, tag: Optional[str] = None) -> None:
+    """
+    Set a cached value with TTL in seconds, ignoring Redis errors
+    If a tag is given, the key is recorded under it for cache_invalidate
+    """
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.set(key, value, ex=ttl)
+            if tag:
+                pipe.sadd(tag, key)
+                pipe.expire(tag, ttl)
+            await pipe.execute()
+    except RedisError:
+        pass
+
+
+async def cache_exists(*keys: str) -> Optional[bool]:
+    """Check whether any key exists; None if Redis is unavailable"""
+    try:
+        return await redis_client.exists(*keys) > 0
+    except RedisError:
+        return None
+
+
+async def cache_claim(key: str, ttl: int) -> Optional[bool]:
+    """
+    Atomically set a marker key unless it already exists (SET NX EX)
+    True if this call set it, False if it was already set, None if Redis is unavailable
+    """
+    try:
+        return bool(await redis_client.set(key, "1", ex=ttl, nx=True))
+    except RedisError:
+        return None
+
+
+async def cache_delete(*keys: str) -> None:
+    """Delete keys, ignoring Redis errors"""
+    try:
+        await redis_client.delete(*keys)
+    except RedisError:
+        pass
+
+
+async def cache_invalidate(tag: str) -> None:
+    """Delete every key recorded under a tag"""
+    try:
+        keys = await redis_client.smembers(tag)
+        await redis_client.delete(tag, *keys)
+    except RedisError:
+        pass
+
+
+async def close_cache():
+    """Close Redis connections"""
+    await redis_client.aclose()
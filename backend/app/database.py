@@ -2,12 +2,17 @@
 CertiTrack Database Configuration
 Async SQLAlchemy setup with PostgreSQL
 """
+import logging
+
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy import MetaData
+from sqlalchemy import DefaultClause, Index, MetaData, func, select, text
 
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
 # Naming convention for constraints (helps with migrations)
 convention = {
     "ix": "ix_%(column_0_label)s",
@@ -23,15 +28,32 @@ metadata = MetaData(naming_convention=convention)
 class Base(DeclarativeBase):
     """Base class for all database models"""
     metadata = metadata
+    # Timestamps are generated by the database; fetch them with RETURNING on
+    # INSERT and UPDATE so flushed objects never need a refresh
+    __mapper_args__ = {"eager_defaults": True}
 
 
 # Create async engine
 engine = create_async_engine(
     settings.database_url,
     echo=settings.debug,
-    pool_size=5,
-    max_overflow=10,
-    pool_pre_ping=True,
+    pool_size=settings.database_pool_size,
+    max_overflow=settings.database_max_overflow,
+    # Recycle instead of pinging on every checkout (saves a round trip per request)
+    pool_pre_ping=False,
+    pool_recycle=1800,
+    # Compiled SQL cache; sized for every route's statement variants (default 500)
+    query_cache_size=1200,
+    connect_args={
+        # asyncpg prepared statement caches (driver + SQLAlchemy adapter)
+        "statement_cache_size": 1024,
+        "prepared_statement_cache_size": 1024,
+        "server_settings": {
+            # Short OLTP queries never benefit from JIT compilation
+            "jit": "off",
+            "application_name": settings.app_name.lower(),
+        },
+    },
 )
 
 # Session factory
@@ -57,8 +79,127 @@ async def get_db() -> AsyncSession:
             await session.close()
 
 
+# create_all never alters a table that already exists, so anything added to an
+# existing table since it was first created is applied here. Each statement must
+# be idempotent: they all run on every startup.
+SCHEMA_UPGRADES = [
+    # Asset search document (Asset.search_tsv)
+    """
+    ALTER TABLE assets ADD COLUMN IF NOT EXISTS search_tsv tsvector
+        GENERATED ALWAYS AS (to_tsvector('simple',
+            coalesce(name, '') || ' ' || coalesce(asset_code, '') || ' ' ||
+            coalesce(serial_number, '') || ' ' || coalesce(location, ''))) STORED
+    """,
+    # Background PDF render failures (Certificate.pdf_error)
+    "ALTER TABLE certificates ADD COLUMN IF NOT EXISTS pdf_error TEXT",
+    # Certificate numbers assigned by the database (Certificate.certificate_number)
+    "CREATE SEQUENCE IF NOT EXISTS certificate_number_seq",
+    """
+    ALTER TABLE certificates ALTER COLUMN certificate_number SET DEFAULT
+        ('CERT-' || to_char(timezone('utc', now()), 'YYYYMM') || '-'
+        || to_char(nextval('certificate_number_seq'), 'FM999999999900000'))
+    """,
+    # Move the sequence past numbers issued before it existed (only ever forwards)
+    """
+    SELECT setval('certificate_number_seq', issued.max_suffix)
+    FROM (
+        SELECT max(substring(certificate_number FROM '[0-9]+$')::bigint) AS max_suffix
+        FROM certificates
+        WHERE certificate_number ~ '^CERT-[0-9]{6}-[0-9]+$'
+    ) AS issued
+    WHERE issued.max_suffix >= (
+        SELECT CASE WHEN is_called THEN last_value + 1 ELSE last_value END
+        FROM certificate_number_seq
+    )
+    """,
+    # Bring today's test number counter (TestNumberCounter) up to numbers already
+    # issued today, e.g. by a build that predates the counter
+    """
+    INSERT INTO test_number_counters (day, last_value)
+    SELECT timezone('utc', now())::date, max(substring(test_number FROM '[0-9]+$')::integer)
+    FROM tests
+    WHERE test_number LIKE 'TST-' || to_char(timezone('utc', now()), 'YYYYMMDD') || '-%'
+    HAVING max(substring(test_number FROM '[0-9]+$')::integer) IS NOT NULL
+    ON CONFLICT (day) DO UPDATE
+        SET last_value = GREATEST(test_number_counters.last_value, EXCLUDED.last_value)
+    """,
+]
+
+
+def _set_missing_server_defaults(conn) -> None:
+    """Give existing columns the model's server default where they have none yet"""
+    missing = {
+        (table_name, column_name)
+        for table_name, column_name in conn.execute(text(
+            "SELECT table_name, column_name FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND column_default IS NULL"
+        ))
+    }
+    ddl = conn.dialect.ddl_compiler(conn.dialect, None)
+    preparer = conn.dialect.identifier_preparer
+    for table in Base.metadata.sorted_tables:
+        for column in table.columns:
+            # Computed columns also carry a server_default; only plain defaults apply
+            if not isinstance(column.server_default, DefaultClause):
+                continue
+            if (table.name, column.name) not in missing:
+                continue
+            conn.execute(text(
+                f"ALTER TABLE {preparer.format_table(table)} "
+                f"ALTER COLUMN {preparer.format_column(column)} "
+                f"SET DEFAULT {ddl.get_column_default_string(column)}"
+            ))
+
+
+def _create_missing_indexes(conn) -> None:
+    """
+    Create model indexes that existing tables don't have yet
+    A unique index that existing rows violate is logged and skipped instead of
+    failing startup; it is built on a later start once the duplicates are resolved
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if not index.unique:
+                index.create(conn, checkfirst=True)
+                continue
+            try:
+                with conn.begin_nested():
+                    index.create(conn, checkfirst=True)
+            except IntegrityError:
+                _log_duplicates(conn, index)
+
+
+def _log_duplicates(conn, index: Index) -> None:
+    """Log the key values that keep a unique index from being built"""
+    columns = list(index.columns)
+    query = (
+        select(*columns, func.count().label("row_count"))
+        .group_by(*columns)
+        .having(func.count() > 1)
+        .limit(20)
+    )
+    where = index.dialect_options["postgresql"]["where"]
+    if where is not None:
+        query = query.where(where)
+    duplicates = conn.execute(query).all()
+    logger.error(
+        "Unique index %s not created: duplicate %s values in %s (first %d): %s",
+        index.name,
+        ", ".join(column.name for column in columns),
+        index.table.name,
+        len(duplicates),
+        duplicates,
+    )
+
+
 async def init_db():
-    """Initialize database tables"""
+    """Initialize database tables and upgrade ones created by earlier releases"""
     async with engine.begin() as conn:
+        # Trigram operator classes used by asset search indexes
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
         await conn.run_sync(Base.metadata.create_all)
+        for statement in SCHEMA_UPGRADES:
+            await conn.execute(text(statement))
+        await conn.run_sync(_set_missing_server_defaults)
+        await conn.run_sync(_create_missing_indexes)
 
@@ -0,0 +1,24 @@
+"""
+CertiTrack Identifiers
+Time-ordered UUIDv7 primary keys
+"""
+import os
+import time
+import uuid
+
+
+def uuid7() -> uuid.UUID:
+    """
+    Generate a UUIDv7 (RFC 9562): 48-bit Unix milliseconds, then 74 random bits
+    New keys sort after older ones, so B-tree inserts land on the rightmost leaf
+    """
+    unix_ms = time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), "big")
+    value = (
+        (unix_ms & 0xFFFF_FFFF_FFFF) << 80
+        | 0x7 << 76                          # version
+        | (rand >> 68 & 0xFFF) << 64         # rand_a
+        | 0b10 << 62                         # variant
+        | rand & 0x3FFF_FFFF_FFFF_FFFF       # rand_b
+    )
+    return uuid.UUID(int=value)
@@ -4,13 +4,17 @@ Main FastAPI Application
 """
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
 
 from app.config import settings
 from app.database import init_db
+from app.cache import close_cache
+from app.services.certificate_service import start_pdf_executor, shutdown_pdf_executor
 from app.api import api_router
+from app.api.pagination import NEXT_CURSOR_HEADER
 
 
 @asynccontextmanager
@@ -27,10 +31,14 @@ async def lifespan(app: FastAPI):
     os.makedirs(os.path.join(static_dir, "certificates"), exist_ok=True)
     os.makedirs(os.path.join(static_dir, "uploads"), exist_ok=True)
     
+    start_pdf_executor()
+    
     yield
     
     # Shutdown
     print("👋 Shutting down CertiTrack API...")
+    await close_cache()
+    shutdown_pdf_executor()
 
 
 # Create FastAPI app
@@ -58,6 +66,7 @@ app = FastAPI(
     """,
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     docs_url="/api/docs",
     redoc_url="/api/redoc",
     openapi_url="/api/openapi.json",
@@ -81,6 +90,7 @@ if settings.app_env == "development" or settings.debug:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[NEXT_CURSOR_HEADER],
     )
 else:
     app.add_middleware(
@@ -89,6 +99,7 @@ else:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[NEXT_CURSOR_HEADER],
     )
 
 # Static files
@@ -3,14 +3,17 @@ Asset Models - Equipment Registry
 Crane, Load Cell, Shackle, Wire Rope, etc.
 """
 import uuid
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from enum import Enum as PyEnum
 from typing import Optional, List
-from sqlalchemy import String, Boolean, DateTime, Date, ForeignKey, Text, Enum, Float, Integer
-from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy import String, Boolean, DateTime, Date, ForeignKey, Text, Enum, Float, Integer, Index, Computed, text, func
+from sqlalchemy import event, and_
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import Mapped, mapped_column, relationship, Session, with_loader_criteria
+from sqlalchemy.dialects.postgresql import UUID, JSONB, TSVECTOR
 
 from app.database import Base
+from app.ids import uuid7
 
 
 class AssetCategory(str, PyEnum):
@@ -68,7 +71,7 @@ class Asset(Base):
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), 
         primary_key=True, 
-        default=uuid.uuid4
+        default=uuid7
     )
     
     # Company (Multi-tenant)
@@ -126,11 +129,23 @@ class Asset(Base):
     certificate_expiry_date: Mapped[Optional[date]] = mapped_column(Date)
     
     # Additional Data (flexible JSON field)
-    extra_data: Mapped[Optional[dict]] = mapped_column(JSONB, default=dict)
+    extra_data: Mapped[Optional[dict]] = mapped_column(JSONB, default=dict, server_default=text("'{}'::jsonb"))
     
     # Photo
     photo_url: Mapped[Optional[str]] = mapped_column(String(500))
     
+    # Full-text search document (generated by Postgres, never loaded with the entity)
+    search_tsv: Mapped[Optional[str]] = mapped_column(
+        TSVECTOR,
+        Computed(
+            "to_tsvector('simple', "
+            "coalesce(name, '') || ' ' || coalesce(asset_code, '') || ' ' || "
+            "coalesce(serial_number, '') || ' ' || coalesce(location, ''))",
+            persisted=True,
+        ),
+        deferred=True,
+    )
+    
     # Soft delete
     is_deleted: Mapped[bool] = mapped_column(Boolean, default=False)
     deleted_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
@@ -138,31 +153,33 @@ class Asset(Base):
     # Timestamps
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), 
-        default=datetime.utcnow
+        server_default=func.now()
     )
     updated_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), 
-        default=datetime.utcnow, 
-        onupdate=datetime.utcnow
+        server_default=func.now(), 
+        onupdate=func.now()
     )
     
-    # Relationships
-    company: Mapped["Company"] = relationship("Company", back_populates="assets")
+    # Relationships (raise on lazy load; load explicitly with joinedload/selectinload)
+    company: Mapped["Company"] = relationship("Company", back_populates="assets", lazy="raise")
     certificates: Mapped[List["Certificate"]] = relationship(
         "Certificate", 
         back_populates="asset",
-        cascade="all, delete-orphan"
+        cascade="all, delete-orphan",
+        lazy="raise"
     )
     tests: Mapped[List["Test"]] = relationship(
         "Test", 
         back_populates="asset",
-        cascade="all, delete-orphan"
+        cascade="all, delete-orphan",
+        lazy="raise"
     )
     
     def __repr__(self) -> str:
         return f"<Asset {self.asset_code}: {self.name}>"
     
-    @property
+    @hybrid_property
     def is_certificate_expiring_soon(self) -> bool:
         """Check if certificate expires within 30 days"""
         if not self.certificate_expiry_date:
@@ -170,12 +187,115 @@ class Asset(Base):
         days_until_expiry = (self.certificate_expiry_date - date.today()).days
         return 0 < days_until_expiry <= 30
     
-    @property
+    @is_certificate_expiring_soon.expression
+    def is_certificate_expiring_soon(cls):
+        """SQL form (range on certificate_expiry_date; NULL dates are False, not NULL)"""
+        today = date.today()
+        return and_(
+            cls.certificate_expiry_date.is_not(None),
+            cls.certificate_expiry_date > today,
+            cls.certificate_expiry_date <= today + timedelta(days=30),
+        )
+    
+    @hybrid_property
     def is_certificate_expired(self) -> bool:
         """Check if certificate has expired"""
         if not self.certificate_expiry_date:
             return False
         return self.certificate_expiry_date < date.today()
+    
+    @is_certificate_expired.expression
+    def is_certificate_expired(cls):
+        """SQL form (range on certificate_expiry_date; NULL dates are False, not NULL)"""
+        return and_(
+            cls.certificate_expiry_date.is_not(None),
+            cls.certificate_expiry_date < date.today(),
+        )
+
+# Indexes
+# Tenant feed for list_assets: equality column first, then the keyset sort order.
+# Partial on live rows so soft-deleted assets never bloat the index.
+Index(
+    "ix_assets_tenant_feed",
+    Asset.company_id,
+    Asset.created_at.desc(),
+    Asset.id.desc(),
+    postgresql_where=Asset.is_deleted == False,
+)
+# Asset codes are unique per company among live assets (create_asset duplicate check)
+Index(
+    "ix_assets_company_code",
+    Asset.company_id,
+    Asset.asset_code,
+    unique=True,
+    postgresql_where=Asset.is_deleted == False,
+)
+# Dashboard expiry counters and expiring-assets list, per tenant
+Index(
+    "ix_assets_company_expiry",
+    Asset.company_id,
+    Asset.certificate_expiry_date,
+    postgresql_where=Asset.is_deleted == False,
+)
+# Daily expiry-alert scan across all tenants (range on expiry date, no company)
+Index(
+    "ix_assets_live_expiry",
+    Asset.certificate_expiry_date,
+    postgresql_where=Asset.is_deleted == False,
+)
+# Status filter and by-status dashboard counts, per tenant
+Index(
+    "ix_assets_company_status",
+    Asset.company_id,
+    Asset.status,
+    postgresql_where=Asset.is_deleted == False,
+)
+# QR scan lookup
+Index(
+    "ix_assets_qr_data",
+    Asset.qr_data,
+    postgresql_where=Asset.is_deleted == False,
+)
+# Asset search: word matches via full-text, partial asset codes via trigrams
+Index(
+    "ix_assets_search_tsv",
+    Asset.search_tsv,
+    postgresql_using="gin",
+    postgresql_where=Asset.is_deleted == False,
+)
+Index(
+    "ix_assets_asset_code_trgm",
+    Asset.asset_code,
+    postgresql_using="gin",
+    postgresql_ops={"asset_code": "gin_trgm_ops"},
+    postgresql_where=Asset.is_deleted == False,
+)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _exclude_deleted_assets(execute_state):
+    """
+    Hide soft-deleted assets from every ORM select that returns Asset rows or columns,
+    or that selects FROM assets directly (e.g. count(*) with select_from(Asset))
+    Opt out with .execution_options(include_deleted=True)
+    """
+    if (
+        execute_state.is_select
+        and not execute_state.is_column_load
+        and not execute_state.is_relationship_load
+        and not execute_state.execution_options.get("include_deleted", False)
+        and (
+            Asset.__mapper__ in execute_state.all_mappers
+            or Asset.__table__ in execute_state.statement.get_final_froms()
+        )
+    ):
+        execute_state.statement = execute_state.statement.options(
+            with_loader_criteria(
+                Asset,
+                Asset.is_deleted == False,
+                propagate_to_loaders=False,
+            )
+        )
 
 
 # Import at bottom to avoid circular imports
@@ -6,11 +6,13 @@ import uuid
 from datetime import datetime, date
 from enum import Enum as PyEnum
 from typing import Optional
-from sqlalchemy import String, DateTime, Date, ForeignKey, Text, Enum
+from sqlalchemy import String, DateTime, Date, ForeignKey, Text, Enum, Index, Integer, Sequence, text, func, and_, type_coerce
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 
 from app.database import Base
+from app.ids import uuid7
 
 
 class CertificateStatus(str, PyEnum):
@@ -31,6 +33,10 @@ class CertificateType(str, PyEnum):
     ANNUAL = "annual"  # Annual certification
 
 
+# Monotonic counter behind certificate numbers (nextval is atomic, so no duplicates)
+certificate_number_seq = Sequence("certificate_number_seq", metadata=Base.metadata)
+
+
 class Certificate(Base):
     """Certificate model - Digital certification document"""
     __tablename__ = "certificates"
@@ -38,7 +44,7 @@ class Certificate(Base):
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), 
         primary_key=True, 
-        default=uuid.uuid4
+        default=uuid7
     )
     
     # Asset reference
@@ -49,10 +55,15 @@ class Certificate(Base):
     )
     
     # Certificate Info
+    # Format: CERT-YYYYMM-XXXXX, assigned by the database on insert
     certificate_number: Mapped[str] = mapped_column(
         String(100), 
         unique=True, 
-        nullable=False
+        nullable=False,
+        server_default=text(
+            "('CERT-' || to_char(timezone('utc', now()), 'YYYYMM') || '-' "
+            "|| to_char(nextval('certificate_number_seq'), 'FM999999999900000'))"
+        ),
     )
     certificate_type: Mapped[CertificateType] = mapped_column(
         Enum(CertificateType), 
@@ -78,6 +89,7 @@ class Certificate(Base):
     # PDF Document
     pdf_url: Mapped[Optional[str]] = mapped_column(String(500))
     pdf_hash: Mapped[Optional[str]] = mapped_column(String(64))  # SHA-256 for integrity
+    pdf_error: Mapped[Optional[str]] = mapped_column(Text)  # Last render failure, cleared on success
     
     # Digital Signature
     digital_signature: Mapped[Optional[str]] = mapped_column(Text)
@@ -92,27 +104,27 @@ class Certificate(Base):
     notes: Mapped[Optional[str]] = mapped_column(Text)
     
     # Additional data
-    extra_data: Mapped[Optional[dict]] = mapped_column(JSONB, default=dict)
+    extra_data: Mapped[Optional[dict]] = mapped_column(JSONB, default=dict, server_default=text("'{}'::jsonb"))
     
     # Timestamps
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), 
-        default=datetime.utcnow
+        server_default=func.now()
     )
     updated_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), 
-        default=datetime.utcnow, 
-        onupdate=datetime.utcnow
+        server_default=func.now(), 
+        onupdate=func.now()
     )
     
-    # Relationships
-    asset: Mapped["Asset"] = relationship("Asset", back_populates="certificates")
-    test: Mapped[Optional["Test"]] = relationship("Test", back_populates="certificate")
+    # Relationships (raise on lazy load; load explicitly with joinedload/selectinload)
+    asset: Mapped["Asset"] = relationship("Asset", back_populates="certificates", lazy="raise")
+    test: Mapped[Optional["Test"]] = relationship("Test", back_populates="certificate", lazy="raise")
     
     def __repr__(self) -> str:
         return f"<Certificate {self.certificate_number}>"
     
-    @property
+    @hybrid_property
     def is_valid(self) -> bool:
         """Check if certificate is currently valid"""
         return (
@@ -120,10 +132,38 @@ class Certificate(Base):
             and self.expiry_date >= date.today()
         )
     
-    @property
+    @is_valid.expression
+    def is_valid(cls):
+        """SQL form (uses ix_certificates_expiry_issued when filtering)"""
+        return and_(
+            cls.status == CertificateStatus.ISSUED,
+            cls.expiry_date >= date.today(),
+        )
+    
+    @hybrid_property
     def days_until_expiry(self) -> int:
         """Calculate days until expiry"""
         return (self.expiry_date - date.today()).days
+    
+    @days_until_expiry.expression
+    def days_until_expiry(cls):
+        """SQL form (date - date is an integer day count in PostgreSQL)"""
+        return type_coerce(cls.expiry_date - date.today(), Integer)
+
+# Indexes
+# Per-asset certificate history (list_certificates asset/status filters, newest first)
+Index(
+    "ix_certificates_asset_status_created",
+    Certificate.asset_id,
+    Certificate.status,
+    Certificate.created_at.desc(),
+)
+# Expiring-soon range scans only ever look at issued certificates
+Index(
+    "ix_certificates_expiry_issued",
+    Certificate.expiry_date,
+    postgresql_where=Certificate.status == CertificateStatus.ISSUED,
+)
 
 
 # Import at bottom to avoid circular imports
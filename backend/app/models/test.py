@@ -3,14 +3,15 @@ Test Models
 Equipment testing and examination records
 """
 import uuid
-from datetime import datetime
+from datetime import date, datetime
 from enum import Enum as PyEnum
 from typing import Optional, List
-from sqlalchemy import String, DateTime, ForeignKey, Text, Enum, Float, Boolean
+from sqlalchemy import String, Date, DateTime, ForeignKey, Text, Enum, Float, Boolean, Integer, Index, text, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 
 from app.database import Base
+from app.ids import uuid7
 
 
 class TestStatus(str, PyEnum):
@@ -46,7 +47,7 @@ class Test(Base):
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), 
         primary_key=True, 
-        default=uuid.uuid4
+        default=uuid7
     )
     
     # Asset reference
@@ -91,13 +92,13 @@ class Test(Base):
     test_load_percentage: Mapped[Optional[float]] = mapped_column(Float)  # e.g., 125% of SWL
     
     # Measurements (can be from IoT sensors)
-    measured_values: Mapped[Optional[dict]] = mapped_column(JSONB, default=dict)
+    measured_values: Mapped[Optional[dict]] = mapped_column(JSONB, default=dict, server_default=text("'{}'::jsonb"))
     # Example: {"load_applied": 12.5, "deflection": 2.3, "readings": [...]}
     
     # IoT Integration
     is_automated: Mapped[bool] = mapped_column(Boolean, default=False)
     sensor_id: Mapped[Optional[str]] = mapped_column(String(100))
-    sensor_data: Mapped[Optional[dict]] = mapped_column(JSONB, default=dict)
+    sensor_data: Mapped[Optional[dict]] = mapped_column(JSONB, default=dict, server_default=text("'{}'::jsonb"))
     
     # Location
     test_location: Mapped[Optional[str]] = mapped_column(String(255))
@@ -108,7 +109,7 @@ class Test(Base):
     recommendations: Mapped[Optional[str]] = mapped_column(Text)
     
     # Photo evidence
-    photos: Mapped[Optional[list]] = mapped_column(JSONB, default=list)
+    photos: Mapped[Optional[list]] = mapped_column(JSONB, default=list, server_default=text("'[]'::jsonb"))
     # Example: ["url1", "url2"]
     
     # QR Scan tracking
@@ -121,26 +122,27 @@ class Test(Base):
     validated_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
     
     # Additional metadata
-    extra_data: Mapped[Optional[dict]] = mapped_column(JSONB, default=dict)
+    extra_data: Mapped[Optional[dict]] = mapped_column(JSONB, default=dict, server_default=text("'{}'::jsonb"))
     
     # Timestamps
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), 
-        default=datetime.utcnow
+        server_default=func.now()
     )
     updated_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), 
-        default=datetime.utcnow, 
-        onupdate=datetime.utcnow
+        server_default=func.now(), 
+        onupdate=func.now()
     )
     
-    # Relationships
-    asset: Mapped["Asset"] = relationship("Asset", back_populates="tests")
-    inspector: Mapped[Optional["User"]] = relationship("User", back_populates="tests_conducted")
+    # Relationships (raise on lazy load; load explicitly with joinedload/selectinload)
+    asset: Mapped["Asset"] = relationship("Asset", back_populates="tests", lazy="raise")
+    inspector: Mapped[Optional["User"]] = relationship("User", back_populates="tests_conducted", lazy="raise")
     certificate: Mapped[Optional["Certificate"]] = relationship(
         "Certificate", 
         back_populates="test",
-        uselist=False
+        uselist=False,
+        lazy="raise"
     )
     
     def __repr__(self) -> str:
@@ -175,6 +177,35 @@ class Test(Base):
         return TestResult.PASS
 
 
+class TestNumberCounter(Base):
+    """Last test number issued per day (TST-YYYYMMDD-XXXX), claimed by upsert"""
+    __tablename__ = "test_number_counters"
+    
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    last_value: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+# Indexes
+# Recent tests feed and dashboard month windows (joined to assets for tenancy)
+Index(
+    "ix_tests_created_asset",
+    Test.created_at.desc(),
+    Test.asset_id,
+)
+# Per-asset test history (list_tests asset filter, keyset order; tests JOIN assets)
+Index(
+    "ix_tests_asset_created",
+    Test.asset_id,
+    Test.created_at.desc(),
+)
+# list_tests result filter
+Index(
+    "ix_tests_result_created",
+    Test.result,
+    Test.created_at,
+)
+
+
 # Import at bottom to avoid circular imports
 from app.models.asset import Asset
 from app.models.user import User
@@ -5,11 +5,12 @@ import uuid
 from datetime import datetime
 from enum import Enum as PyEnum
 from typing import Optional, List
-from sqlalchemy import String, Boolean, DateTime, ForeignKey, Text, Enum
+from sqlalchemy import String, Boolean, DateTime, ForeignKey, Text, Enum, Index, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID
 
 from app.database import Base
+from app.ids import uuid7
 
 
 class UserRole(str, PyEnum):
@@ -27,7 +28,7 @@ class Company(Base):
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), 
         primary_key=True, 
-        default=uuid.uuid4
+        default=uuid7
     )
     name: Mapped[str] = mapped_column(String(255), nullable=False)
     slug: Mapped[str] = mapped_column(String(100), unique=True, nullable=False)
@@ -50,17 +51,18 @@ class Company(Base):
     # Timestamps
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), 
-        default=datetime.utcnow
+        server_default=func.now()
     )
     updated_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), 
-        default=datetime.utcnow, 
-        onupdate=datetime.utcnow
+        server_default=func.now(), 
+        onupdate=func.now()
     )
     
     # Relationships
-    users: Mapped[List["User"]] = relationship("User", back_populates="company")
-    assets: Mapped[List["Asset"]] = relationship("Asset", back_populates="company")
+    # Never loaded by the API; raise instead of lazy-loading by accident
+    users: Mapped[List["User"]] = relationship("User", back_populates="company", lazy="raise")
+    assets: Mapped[List["Asset"]] = relationship("Asset", back_populates="company", lazy="raise")
     
     def __repr__(self) -> str:
         return f"<Company {self.name}>"
@@ -73,7 +75,7 @@ class User(Base):
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), 
         primary_key=True, 
-        default=uuid.uuid4
+        default=uuid7
     )
     email: Mapped[str] = mapped_column(String(255), unique=True, nullable=False)
     hashed_password: Mapped[str] = mapped_column(String(255), nullable=False)
@@ -101,22 +103,34 @@ class User(Base):
     # Timestamps
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), 
-        default=datetime.utcnow
+        server_default=func.now()
     )
     updated_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), 
-        default=datetime.utcnow, 
-        onupdate=datetime.utcnow
+        server_default=func.now(), 
+        onupdate=func.now()
     )
     
     # Relationships
-    company: Mapped[Optional["Company"]] = relationship("Company", back_populates="users")
-    tests_conducted: Mapped[List["Test"]] = relationship("Test", back_populates="inspector")
+    # Never loaded by the API; raise instead of lazy-loading by accident
+    company: Mapped[Optional["Company"]] = relationship("Company", back_populates="users", lazy="raise")
+    tests_conducted: Mapped[List["Test"]] = relationship("Test", back_populates="inspector", lazy="raise")
     
     def __repr__(self) -> str:
         return f"<User {self.email}>"
 
 
+# Indexes
+# Per-company user feed (list_users keyset order for company admins,
+# expiry alert recipient lookups by company)
+Index(
+    "ix_users_company_feed",
+    User.company_id,
+    User.created_at.desc(),
+    User.id.desc(),
+)
+
+
 # Import at bottom to avoid circular imports
 from app.models.asset import Asset
 from app.models.test import Test
@@ -5,7 +5,7 @@ from app.schemas.user import (
     UserCreate, UserUpdate, UserResponse, UserLogin, Token, TokenPayload
 )
 from app.schemas.asset import (
-    AssetCreate, AssetUpdate, AssetResponse, AssetListResponse
+    AssetCreate, AssetUpdate, AssetResponse, AssetListItem, AssetListResponse
 )
 from app.schemas.certificate import (
     CertificateCreate, CertificateUpdate, CertificateResponse
@@ -18,7 +18,7 @@ __all__ = [
     # User
     "UserCreate", "UserUpdate", "UserResponse", "UserLogin", "Token", "TokenPayload",
     # Asset
-    "AssetCreate", "AssetUpdate", "AssetResponse", "AssetListResponse",
+    "AssetCreate", "AssetUpdate", "AssetResponse", "AssetListItem", "AssetListResponse",
     # Certificate
     "CertificateCreate", "CertificateUpdate", "CertificateResponse",
     # Test
@@ -4,7 +4,7 @@ Asset Schemas
 from datetime import datetime, date
 from typing import Optional, List, Any
 from uuid import UUID
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 from app.models.asset import AssetCategory, AssetType, AssetStatus
 
@@ -95,17 +95,38 @@ class AssetResponse(AssetBase):
     created_at: datetime
     updated_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True, extra="ignore")
+
+
+class AssetListItem(BaseModel):
+    """Slim asset row for list views (no QR, photo or extra data)"""
+    id: UUID
+    company_id: UUID
+    asset_code: str
+    name: str
+    category: AssetCategory
+    asset_type: AssetType
+    status: AssetStatus
+    serial_number: Optional[str]
+    location: Optional[str]
+    safe_working_load: Optional[float]
+    swl_unit: str
+    certificate_expiry_date: Optional[date]
+    
+    # Computed fields
+    is_certificate_expiring_soon: bool = False
+    is_certificate_expired: bool = False
+    
+    created_at: datetime
+    
+    model_config = ConfigDict(from_attributes=True, extra="ignore")
 
 
 class AssetListResponse(BaseModel):
-    """Paginated asset list response"""
-    items: List[AssetResponse]
-    total: int
-    page: int
-    page_size: int
-    pages: int
+    """Cursor-paginated asset list response"""
+    items: List[AssetListItem]
+    next_cursor: Optional[str] = None  # Pass back as `cursor` for the next page
+    limit: int
 
 
 class AssetQRScan(BaseModel):
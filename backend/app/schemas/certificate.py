@@ -4,7 +4,7 @@ Certificate Schemas
 from datetime import datetime, date
 from typing import Optional
 from uuid import UUID
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, computed_field
 
 from app.models.certificate import CertificateStatus, CertificateType
 
@@ -49,14 +49,21 @@ class CertificateResponse(CertificateBase):
     signed_by: Optional[str]
     signed_at: Optional[datetime]
     
-    is_valid: bool = False
-    days_until_expiry: int = 0
-    
     created_at: datetime
     updated_at: datetime
     
-    class Config:
-        from_attributes = True
+    # Computed fields (derived during serialization, same rules as the model)
+    @computed_field
+    @property
+    def is_valid(self) -> bool:
+        return self.status == CertificateStatus.ISSUED and self.expiry_date >= date.today()
+    
+    @computed_field
+    @property
+    def days_until_expiry(self) -> int:
+        return (self.expiry_date - date.today()).days
+    
+    model_config = ConfigDict(from_attributes=True, extra="ignore")
 
 
 class CertificateGenerateRequest(BaseModel):
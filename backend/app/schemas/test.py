@@ -4,7 +4,7 @@ Test Schemas
 from datetime import datetime
 from typing import Optional, List, Any
 from uuid import UUID
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 from app.models.test import TestStatus, TestResult, TestType
 
@@ -106,8 +106,7 @@ class TestResponse(TestBase):
     created_at: datetime
     updated_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True, extra="ignore")
 
 
 class TestValidation(BaseModel):
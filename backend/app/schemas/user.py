@@ -4,7 +4,7 @@ User Schemas
 from datetime import datetime
 from typing import Optional
 from uuid import UUID
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
 
 from app.models.user import UserRole
 
@@ -34,6 +34,8 @@ class UserUpdate(BaseModel):
 
 class UserResponse(UserBase):
     """Schema for user response"""
+    # Stored emails were validated on write; skip email-validator on reads
+    email: str
     id: UUID
     role: UserRole
     company_id: Optional[UUID]
@@ -42,8 +44,7 @@ class UserResponse(UserBase):
     last_login_at: Optional[datetime]
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True, extra="ignore")
 
 
 class UserLogin(BaseModel):
@@ -91,6 +92,8 @@ class CompanyUpdate(BaseModel):
 
 class CompanyResponse(CompanyBase):
     """Schema for company response"""
+    # Stored emails were validated on write; skip email-validator on reads
+    email: str
     id: UUID
     slug: str
     logo_url: Optional[str]
@@ -98,6 +101,5 @@ class CompanyResponse(CompanyBase):
     is_active: bool
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True, extra="ignore")
 
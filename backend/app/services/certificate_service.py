@@ -2,258 +2,205 @@
 Certificate Service
 PDF generation and certificate management
 """
+import asyncio
+import logging
+import multiprocessing
 import os
-from datetime import datetime
-from typing import Optional, Dict, Any
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import mm, cm
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-from io import BytesIO
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+from typing import Optional, Dict, Any, Tuple
+from sqlalchemy import select, update
+from sqlalchemy.engine import RowMapping
+from weasyprint import HTML
 import hashlib
 
+from app.database import async_session_maker
 from app.models.certificate import Certificate, CertificateType
 from app.models.asset import Asset
 from app.models.test import Test
 from app.services.qr_service import generate_qr_code_base64
+from app.templating import jinja_env
 
+logger = logging.getLogger(__name__)
 
 # Ensure certificates directory exists
 CERTIFICATES_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "static", "certificates")
 os.makedirs(CERTIFICATES_DIR, exist_ok=True)
 
+# PDF rendering is CPU-bound and holds the GIL, so it runs in worker processes
+# (started and stopped by the app lifespan; None falls back to the default thread pool)
+_pdf_executor: Optional[ProcessPoolExecutor] = None
 
-async def generate_certificate_number(db: AsyncSession) -> str:
+# Certificate layout is a Jinja2 HTML template, compiled once per process
+_CERTIFICATE_TEMPLATE = jinja_env.get_template("certificate.html.j2")
+
+
+async def generate_certificate_pdf(
+    certificate: SimpleNamespace,
+    asset: SimpleNamespace,
+    test: Optional[SimpleNamespace]
+) -> Tuple[str, str]:
     """
-    Generate unique certificate number
-    Format: CERT-YYYYMM-XXXXX
+    Generate PDF certificate document from plain snapshots of the printed fields
+    Returns (file path, SHA-256 hex digest)
     """
-    today = datetime.utcnow().strftime("%Y%m")
-    prefix = f"CERT-{today}-"
+    snapshots = (certificate, asset, test)
     
-    # Get count of certificates this month
-    result = await db.execute(
-        select(func.count(Certificate.id)).where(
-            Certificate.certificate_number.like(f"{prefix}%")
-        )
-    )
-    count = result.scalar() or 0
+    # Files are named by a hash of their inputs, so identical re-renders reuse the file
+    render_key = hashlib.sha256(repr(snapshots).encode()).hexdigest()
+    filepath = os.path.join(CERTIFICATES_DIR, f"{render_key}.pdf")
     
-    # Generate new number
-    new_number = f"{prefix}{count + 1:05d}"
+    # Render in a worker process
+    loop = asyncio.get_running_loop()
+    pdf_hash = await loop.run_in_executor(
+        _pdf_executor, _render_pdf_sync, filepath, *snapshots
+    )
     
-    return new_number
+    return filepath, pdf_hash
 
 
-async def generate_certificate_pdf(
-    certificate: Certificate,
-    asset: Asset,
-    test: Optional[Test],
-    db: AsyncSession
+# Fields printed on the certificate, snapshotted for the worker (ORM objects don't pickle)
+_CERTIFICATE_PDF_FIELDS = (
+    "certificate_number", "certificate_type", "issue_date", "expiry_date",
+    "inspector_name", "inspector_certification", "notes", "signed_at", "signed_by",
+)
+_ASSET_PDF_FIELDS = (
+    "asset_code", "name", "asset_type", "manufacturer", "model",
+    "serial_number", "location", "safe_working_load", "swl_unit",
+)
+_TEST_PDF_FIELDS = (
+    "test_number", "test_type", "completed_at", "test_load", "load_unit", "result",
+)
+
+# The printed columns of all three tables, labelled "<section>_<field>" for one joined SELECT
+_PDF_SECTIONS = (
+    ("certificate", Certificate, _CERTIFICATE_PDF_FIELDS),
+    ("asset", Asset, _ASSET_PDF_FIELDS),
+    ("test", Test, _TEST_PDF_FIELDS),
+)
+_PDF_COLUMNS = tuple(
+    getattr(model, field).label(f"{section}_{field}")
+    for section, model, fields in _PDF_SECTIONS
+    for field in fields
+)
+
+
+def _snapshot(row: RowMapping, section: str, fields: Tuple[str, ...]) -> SimpleNamespace:
+    """Copy one section's labelled columns into a picklable namespace"""
+    return SimpleNamespace(**{field: row[f"{section}_{field}"] for field in fields})
+
+
+def _render_pdf_sync(
+    filepath: str,
+    certificate: SimpleNamespace,
+    asset: SimpleNamespace,
+    test: Optional[SimpleNamespace]
 ) -> str:
     """
-    Generate PDF certificate document
-    Returns file path
+    Build the certificate PDF (runs in the PDF process pool)
+    Returns the SHA-256 hex digest of the file; an existing file is reused
     """
-    filename = f"{certificate.certificate_number.replace('/', '-')}.pdf"
-    filepath = os.path.join(CERTIFICATES_DIR, filename)
-    
-    # Create PDF
-    doc = SimpleDocTemplate(
-        filepath,
-        pagesize=A4,
-        rightMargin=2*cm,
-        leftMargin=2*cm,
-        topMargin=2*cm,
-        bottomMargin=2*cm
-    )
-    
-    # Styles
-    styles = getSampleStyleSheet()
-    
-    title_style = ParagraphStyle(
-        'Title',
-        parent=styles['Heading1'],
-        fontSize=24,
-        alignment=TA_CENTER,
-        spaceAfter=30,
-        textColor=colors.HexColor("#1a1a1a"),
-        fontName='Helvetica-Bold'
-    )
-    
-    subtitle_style = ParagraphStyle(
-        'Subtitle',
-        parent=styles['Heading2'],
-        fontSize=14,
-        alignment=TA_CENTER,
-        spaceAfter=20,
-        textColor=colors.HexColor("#666666")
-    )
-    
-    label_style = ParagraphStyle(
-        'Label',
-        parent=styles['Normal'],
-        fontSize=10,
-        textColor=colors.HexColor("#888888")
-    )
-    
-    value_style = ParagraphStyle(
-        'Value',
-        parent=styles['Normal'],
-        fontSize=12,
-        textColor=colors.HexColor("#1a1a1a"),
-        fontName='Helvetica-Bold'
+    if os.path.exists(filepath):
+        return _file_sha256(filepath)
+    
+    # Fill the compiled template, then lay it out to PDF bytes in memory
+    # so they are hashed and written in a single pass
+    html = _CERTIFICATE_TEMPLATE.render(
+        certificate=certificate,
+        certificate_type_name=_get_certificate_type_name(certificate.certificate_type),
+        asset=asset,
+        test=test,
     )
+    pdf_bytes = HTML(string=html).write_pdf()
     
-    # Build content
-    content = []
-    
-    # Header
-    content.append(Paragraph("CERTIFICATE", title_style))
-    content.append(Paragraph(
-        _get_certificate_type_name(certificate.certificate_type),
-        subtitle_style
-    ))
-    content.append(Spacer(1, 20))
-    
-    # Certificate number
-    content.append(Paragraph("Certificate No.", label_style))
-    content.append(Paragraph(certificate.certificate_number, value_style))
-    content.append(Spacer(1, 15))
-    
-    # Asset information table
-    asset_data = [
-        ["Asset Information", ""],
-        ["Asset Code:", asset.asset_code],
-        ["Name:", asset.name],
-        ["Type:", asset.asset_type.value.replace("_", " ").title()],
-        ["Manufacturer:", asset.manufacturer or "-"],
-        ["Model:", asset.model or "-"],
-        ["Serial Number:", asset.serial_number or "-"],
-        ["Location:", asset.location or "-"],
-    ]
-    
-    if asset.safe_working_load:
-        asset_data.append(["Safe Working Load:", f"{asset.safe_working_load} {asset.swl_unit}"])
-    
-    asset_table = Table(asset_data, colWidths=[150, 300])
-    asset_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#f5f5f5")),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor("#1a1a1a")),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('TEXTCOLOR', (0, 1), (0, -1), colors.HexColor("#666666")),
-        ('TEXTCOLOR', (1, 1), (1, -1), colors.HexColor("#1a1a1a")),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor("#e0e0e0")),
-    ]))
-    
-    content.append(asset_table)
-    content.append(Spacer(1, 20))
-    
-    # Test information (if available)
-    if test:
-        test_data = [
-            ["Test Information", ""],
-            ["Test Number:", test.test_number],
-            ["Test Type:", test.test_type.value.replace("_", " ").title()],
-            ["Test Date:", test.completed_at.strftime("%d %B %Y") if test.completed_at else "-"],
-            ["Test Load:", f"{test.test_load} {test.load_unit}" if test.test_load else "-"],
-            ["Result:", test.result.value.upper()],
-        ]
-        
-        test_table = Table(test_data, colWidths=[150, 300])
-        test_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#f5f5f5")),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor("#1a1a1a")),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('TEXTCOLOR', (0, 1), (0, -1), colors.HexColor("#666666")),
-            ('TEXTCOLOR', (1, 1), (1, -1), colors.HexColor("#1a1a1a")),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor("#e0e0e0")),
-        ]))
-        
-        content.append(test_table)
-        content.append(Spacer(1, 20))
-    
-    # Certification details
-    cert_data = [
-        ["Certification Details", ""],
-        ["Issue Date:", certificate.issue_date.strftime("%d %B %Y")],
-        ["Expiry Date:", certificate.expiry_date.strftime("%d %B %Y")],
-        ["Inspector:", certificate.inspector_name or "-"],
-        ["Certification:", certificate.inspector_certification or "-"],
-    ]
-    
-    cert_table = Table(cert_data, colWidths=[150, 300])
-    cert_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#f5f5f5")),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor("#1a1a1a")),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('TEXTCOLOR', (0, 1), (0, -1), colors.HexColor("#666666")),
-        ('TEXTCOLOR', (1, 1), (1, -1), colors.HexColor("#1a1a1a")),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor("#e0e0e0")),
-    ]))
-    
-    content.append(cert_table)
-    content.append(Spacer(1, 30))
-    
-    # Notes
-    if certificate.notes:
-        content.append(Paragraph("Notes:", label_style))
-        content.append(Paragraph(certificate.notes, styles['Normal']))
-        content.append(Spacer(1, 20))
-    
-    # Footer with signature and QR code
-    footer_text = f"""
-    <para alignment="center">
-    <font size="9" color="#666666">
-    This certificate was digitally signed on {certificate.signed_at.strftime("%d %B %Y at %H:%M") if certificate.signed_at else '-'}
-    by {certificate.signed_by or 'CertiTrack System'}.
-    <br/><br/>
-    Verify this certificate at: certitrack.app/verify/{certificate.certificate_number}
-    </font>
-    </para>
-    """
-    content.append(Paragraph(footer_text, styles['Normal']))
-    
-    # Build PDF
-    doc.build(content)
+    # Write to a temporary name, then move into place atomically
+    tmp_path = f"{filepath}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(pdf_bytes)
+    os.replace(tmp_path, filepath)
     
     # Calculate hash for integrity verification
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def _file_sha256(filepath: str) -> str:
+    """SHA-256 hex digest of a file (streamed, never read whole into memory)"""
     with open(filepath, "rb") as f:
-        pdf_hash = hashlib.sha256(f.read()).hexdigest()
-    
-    # Update certificate with hash
-    certificate.pdf_hash = pdf_hash
-    
-    return filepath
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+async def render_certificate_pdf(certificate_id: uuid.UUID) -> None:
+    """
+    Render a certificate's PDF and store its path and hash on the certificate
+    Runs as a background task after the response, with its own session
+    """
+    async with async_session_maker() as session:
+        # One joined SELECT of exactly the printed columns (issued certificates
+        # stay printable even if their asset was soft-deleted since)
+        result = await session.execute(
+            select(*_PDF_COLUMNS)
+            .join(Asset, Certificate.asset_id == Asset.id)
+            .outerjoin(Test, Certificate.test_id == Test.id)
+            .where(Certificate.id == certificate_id)
+            .execution_options(include_deleted=True)
+        )
+        row = result.mappings().first()
+        if not row:
+            return
+        
+        try:
+            pdf_url, pdf_hash = await generate_certificate_pdf(
+                _snapshot(row, "certificate", _CERTIFICATE_PDF_FIELDS),
+                _snapshot(row, "asset", _ASSET_PDF_FIELDS),
+                _snapshot(row, "test", _TEST_PDF_FIELDS) if row["test_test_number"] is not None else None,
+            )
+            values = {"pdf_url": pdf_url, "pdf_hash": pdf_hash, "pdf_error": None}
+        except Exception as exc:
+            # Recorded so /pdf-status reports the failure instead of pending forever
+            logger.exception("PDF render failed for certificate %s", certificate_id)
+            values = {"pdf_error": f"{type(exc).__name__}: {exc}"[:500]}
+        
+        # Single UPDATE writes back the result
+        await session.execute(
+            update(Certificate)
+            .where(Certificate.id == certificate_id)
+            .values(**values)
+        )
+        await session.commit()
+
+
+# Human-readable certificate type names
+_CERT_TYPE_NAMES = {
+    CertificateType.LOAD_TEST: "Load Test Certificate",
+    CertificateType.THOROUGH_EXAMINATION: "Thorough Examination Certificate",
+    CertificateType.CALIBRATION: "Calibration Certificate",
+    CertificateType.INSPECTION: "Inspection Certificate",
+    CertificateType.ANNUAL: "Annual Certification",
+}
 
 
 def _get_certificate_type_name(cert_type: CertificateType) -> str:
     """Get human-readable certificate type name"""
-    names = {
-        CertificateType.LOAD_TEST: "Load Test Certificate",
-        CertificateType.THOROUGH_EXAMINATION: "Thorough Examination Certificate",
-        CertificateType.CALIBRATION: "Calibration Certificate",
-        CertificateType.INSPECTION: "Inspection Certificate",
-        CertificateType.ANNUAL: "Annual Certification",
-    }
-    return names.get(cert_type, "Certificate")
+    return _CERT_TYPE_NAMES.get(cert_type, "Certificate")
+
+
+
+def start_pdf_executor() -> None:
+    """
+    Start the PDF worker processes
+    Workers come from a forkserver, never fork() of the threaded server process
+    """
+    global _pdf_executor
+    _pdf_executor = ProcessPoolExecutor(
+        max_workers=os.cpu_count(),
+        mp_context=multiprocessing.get_context("forkserver"),
+    )
+
 
+def shutdown_pdf_executor() -> None:
+    """Stop the PDF worker processes"""
+    global _pdf_executor
+    if _pdf_executor is not None:
+        _pdf_executor.shutdown(wait=False, cancel_futures=True)
+        _pdf_executor = None
@@ -3,235 +3,281 @@ Notification Service
 Email and WhatsApp alerts for certificate expiry
 """
 import asyncio
+import logging
+from collections import defaultdict
+from itertools import groupby
+from operator import attrgetter
 from datetime import date, timedelta
-from typing import List, Optional
+from typing import List, NamedTuple, Optional, Tuple
+from uuid import UUID
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import aiosmtplib
-from jinja2 import Template
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from app.config import settings
-from app.models.asset import Asset
+from app.models.asset import Asset, AssetType
 from app.models.user import User, Company
+from app.services.smtp_pool import SMTPPool
+from app.templating import jinja_env
 
+logger = logging.getLogger(__name__)
 
-async def send_email(
-    to_email: str,
+# Sender header (settings are fixed for the process lifetime)
+_SMTP_FROM = f"{settings.smtp_from_name} <{settings.smtp_from_email}>"
+
+# Compiled once at import; rendered per alert
+_EXPIRY_HTML_TEMPLATE = jinja_env.get_template("expiry_alert.html.j2")
+_EXPIRY_TEXT_TEMPLATE = jinja_env.get_template("expiry_alert.txt.j2")
+
+
+class AlertRow(NamedTuple):
+    """An asset due for an expiry alert (the columns the alert email prints)"""
+    company_id: UUID
+    id: UUID
+    asset_code: str
+    name: str
+    asset_type: AssetType
+    location: Optional[str]
+    certificate_expiry_date: date
+    days_remaining: int
+
+
+def _smtp_configured() -> bool:
+    """Whether SMTP credentials are set"""
+    return bool(settings.smtp_user and settings.smtp_password)
+
+
+def _build_message(
     subject: str,
     html_content: str,
     text_content: Optional[str] = None
+) -> MIMEMultipart:
+    """Build the MIME message without a recipient (set the To header before sending)"""
+    message = MIMEMultipart("alternative")
+    message["From"] = _SMTP_FROM
+    message["Subject"] = subject
+    
+    if text_content:
+        message.attach(MIMEText(text_content, "plain"))
+    message.attach(MIMEText(html_content, "html"))
+    
+    return message
+
+
+async def _send_message(
+    message: MIMEMultipart,
+    to_email: str,
+    smtp_client: Optional[aiosmtplib.SMTP] = None
 ) -> bool:
-    """Send email using SMTP"""
-    if not settings.smtp_user or not settings.smtp_password:
-        print(f"SMTP not configured. Would send email to {to_email}: {subject}")
+    """
+    Address a built message to one recipient and send it
+    Reuses smtp_client if given, otherwise opens a one-off connection
+    """
+    if not _smtp_configured():
+        logger.info("SMTP not configured; skipping email to %s subject=%s", to_email, message["Subject"])
         return False
     
     try:
-        message = MIMEMultipart("alternative")
-        message["From"] = f"{settings.smtp_from_name} <{settings.smtp_from_email}>"
+        del message["To"]
         message["To"] = to_email
-        message["Subject"] = subject
-        
-        if text_content:
-            message.attach(MIMEText(text_content, "plain"))
-        message.attach(MIMEText(html_content, "html"))
         
-        await aiosmtplib.send(
-            message,
-            hostname=settings.smtp_host,
-            port=settings.smtp_port,
-            username=settings.smtp_user,
-            password=settings.smtp_password,
-            use_tls=True,
-        )
+        if smtp_client:
+            await smtp_client.send_message(message)
+        else:
+            await aiosmtplib.send(
+                message,
+                hostname=settings.smtp_host,
+                port=settings.smtp_port,
+                username=settings.smtp_user,
+                password=settings.smtp_password,
+                use_tls=True,
+            )
         
         return True
-    except Exception as e:
-        print(f"Failed to send email: {e}")
+    except Exception:
+        logger.exception("Failed to send email to %s", to_email)
         return False
 
 
+async def send_email(
+    to_email: str,
+    subject: str,
+    html_content: str,
+    text_content: Optional[str] = None,
+    smtp_client: Optional[aiosmtplib.SMTP] = None
+) -> bool:
+    """Send email using SMTP"""
+    message = _build_message(subject, html_content, text_content)
+    return await _send_message(message, to_email, smtp_client)
+
+
 async def send_expiry_alert(
-    asset: Asset,
+    asset: AlertRow,
     recipients: List[str],
-    days_until_expiry: int
+    days_until_expiry: int,
+    smtp_client: Optional[aiosmtplib.SMTP] = None
 ) -> bool:
     """Send certificate expiry alert"""
-    subject = f"⚠️ Certificate Expiring: {asset.name} ({asset.asset_code})"
-    
-    html_template = Template("""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <style>
-            body { font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif; line-height: 1.6; color: #333; }
-            .container { max-width: 600px; margin: 0 auto; padding: 20px; }
-            .header { background: linear-gradient(135deg, #ff6b35 0%, #f7931e 100%); color: white; padding: 30px; border-radius: 8px 8px 0 0; text-align: center; }
-            .content { background: #f9f9f9; padding: 30px; border-radius: 0 0 8px 8px; }
-            .alert-box { background: #fff3cd; border-left: 4px solid #ffc107; padding: 15px; margin: 20px 0; border-radius: 4px; }
-            .info-table { width: 100%; border-collapse: collapse; margin: 20px 0; }
-            .info-table td { padding: 10px; border-bottom: 1px solid #eee; }
-            .info-table td:first-child { color: #666; width: 40%; }
-            .btn { display: inline-block; background: #1a1a1a; color: white; padding: 12px 24px; text-decoration: none; border-radius: 6px; margin-top: 20px; }
-            .footer { text-align: center; color: #666; font-size: 12px; margin-top: 30px; }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>⚠️ Certificate Expiry Alert</h1>
-            </div>
-            <div class="content">
-                <div class="alert-box">
-                    <strong>{{ days }} days remaining</strong> until certificate expiry
-                </div>
-                
-                <h3>Asset Details</h3>
-                <table class="info-table">
-                    <tr>
-                        <td>Asset Code</td>
-                        <td><strong>{{ asset.asset_code }}</strong></td>
-                    </tr>
-                    <tr>
-                        <td>Name</td>
-                        <td>{{ asset.name }}</td>
-                    </tr>
-                    <tr>
-                        <td>Type</td>
-                        <td>{{ asset.asset_type.value | replace('_', ' ') | title }}</td>
-                    </tr>
-                    <tr>
-                        <td>Location</td>
-                        <td>{{ asset.location or '-' }}</td>
-                    </tr>
-                    <tr>
-                        <td>Certificate Expiry</td>
-                        <td><strong>{{ asset.certificate_expiry_date }}</strong></td>
-                    </tr>
-                </table>
-                
-                <p>Please schedule an inspection and certification renewal to ensure compliance.</p>
-                
-                <a href="{{ frontend_url }}/assets/{{ asset.id }}" class="btn">View Asset Details</a>
-                
-                <div class="footer">
-                    <p>This is an automated alert from CertiTrack.</p>
-                    <p>© {{ year }} CertiTrack - Digital Testing & Certification Platform</p>
-                </div>
-            </div>
-        </div>
-    </body>
-    </html>
-    """)
-    
-    html_content = html_template.render(
-        asset=asset,
-        days=days_until_expiry,
-        frontend_url=settings.frontend_url,
-        year=date.today().year
-    )
-    
-    text_content = f"""
-    Certificate Expiry Alert
-    
-    {days_until_expiry} days remaining until certificate expiry
+    # Nothing can be sent, so skip rendering and MIME building entirely
+    if not _smtp_configured():
+        logger.info("SMTP not configured; skipping expiry alert for %s", asset.asset_code)
+        return False
     
-    Asset Details:
-    - Asset Code: {asset.asset_code}
-    - Name: {asset.name}
-    - Type: {asset.asset_type.value}
-    - Location: {asset.location or '-'}
-    - Certificate Expiry: {asset.certificate_expiry_date}
+    subject = f"⚠️ Certificate Expiring: {asset.name} ({asset.asset_code})"
     
-    Please schedule an inspection and certification renewal.
+    context = {
+        "asset": asset,
+        "days": days_until_expiry,
+        "frontend_url": settings.frontend_url,
+        "year": date.today().year,
+    }
+    html_content = _EXPIRY_HTML_TEMPLATE.render(context)
+    text_content = _EXPIRY_TEXT_TEMPLATE.render(context)
     
-    View at: {settings.frontend_url}/assets/{asset.id}
-    """
+    # The body is identical for every recipient; only the To header changes
+    message = _build_message(subject, html_content, text_content)
     
     success = True
     for recipient in recipients:
-        result = await send_email(recipient, subject, html_content, text_content)
+        result = await _send_message(message, recipient, smtp_client)
         if not result:
             success = False
     
     return success
 
 
-async def check_expiring_certificates(db: AsyncSession) -> List[dict]:
+async def check_expiring_certificates(db: AsyncSession) -> List[AlertRow]:
     """
     Check for certificates expiring within alert threshold
-    Returns list of assets needing alerts
+    Returns the assets needing alerts, ordered by company
     """
-    alert_date = date.today() + timedelta(days=settings.alert_days_before_expiry)
+    today = date.today()
+    alert_date = today + timedelta(days=settings.alert_days_before_expiry)
     
+    # Only the printed columns; days remaining is computed in SQL (date - date).
+    # Fetched in one go: send_daily_alerts needs every company up front for the
+    # recipients query and sends all companies concurrently, so the rows are all
+    # alive at once anyway (one small tuple per asset expiring in the window).
     result = await db.execute(
-        select(Asset).where(
-            Asset.is_deleted == False,
-            Asset.certificate_expiry_date <= alert_date,
-            Asset.certificate_expiry_date >= date.today()
+        select(
+            Asset.company_id,
+            Asset.id,
+            Asset.asset_code,
+            Asset.name,
+            Asset.asset_type,
+            Asset.location,
+            Asset.certificate_expiry_date,
+            (Asset.certificate_expiry_date - today).label("days_remaining"),
         )
+        .where(Asset.certificate_expiry_date.between(today, alert_date))
+        .order_by(Asset.company_id, Asset.certificate_expiry_date)
     )
     
-    expiring_assets = result.scalars().all()
-    
-    alerts = []
-    for asset in expiring_assets:
-        days_remaining = (asset.certificate_expiry_date - date.today()).days
-        alerts.append({
-            "asset": asset,
-            "days_remaining": days_remaining,
-            "company_id": asset.company_id
-        })
-    
-    return alerts
+    return [AlertRow(*row) for row in result]
 
 
-async def send_daily_alerts(db: AsyncSession) -> dict:
+async def _send_company_alerts(
+    pool: Optional[SMTPPool],
+    company_alert_list: List[AlertRow],
+    recipients: List[str]
+) -> Tuple[int, int]:
     """
-    Send daily alert emails for expiring certificates
-    Called by scheduled task (Celery)
+    Send one company's alerts over a session borrowed from the pool (one-off
+    connections without a pool); a session the server drops mid-batch is
+    replaced for the remaining alerts
+    Returns (sent, failed)
     """
-    alerts = await check_expiring_certificates(db)
-    
     sent_count = 0
     failed_count = 0
+    smtp_client = None
     
-    # Group by company
-    company_alerts = {}
-    for alert in alerts:
-        cid = str(alert["company_id"])
-        if cid not in company_alerts:
-            company_alerts[cid] = []
-        company_alerts[cid].append(alert)
-    
-    # Send alerts per company
-    for company_id, company_alert_list in company_alerts.items():
-        # Get company admins
-        result = await db.execute(
-            select(User).where(
-                User.company_id == company_id,
-                User.is_active == True
-            )
-        )
-        users = result.scalars().all()
-        recipients = [u.email for u in users]
-        
-        for alert in company_alert_list:
+    try:
+        for position, alert in enumerate(company_alert_list):
+            if pool is not None and (smtp_client is None or not smtp_client.is_connected):
+                if smtp_client is not None:
+                    logger.warning(
+                        "SMTP session dropped; reconnecting for %d remaining alerts",
+                        len(company_alert_list) - position,
+                    )
+                    await pool.release(smtp_client, discard=True)
+                    smtp_client = None
+                try:
+                    smtp_client = await pool.acquire()
+                except Exception:
+                    # Sends report their own failures, so this is connect/login
+                    logger.exception("Failed to open SMTP session")
+                    failed_count += len(company_alert_list) - position
+                    break
+            
             success = await send_expiry_alert(
-                alert["asset"],
+                alert,
                 recipients,
-                alert["days_remaining"]
+                alert.days_remaining,
+                smtp_client=smtp_client
             )
             if success:
                 sent_count += 1
             else:
                 failed_count += 1
+    except BaseException:
+        if smtp_client is not None:
+            await pool.release(smtp_client, discard=True)
+        raise
+    
+    if smtp_client is not None:
+        await pool.release(smtp_client)
+    
+    return sent_count, failed_count
+
+
+async def send_daily_alerts(db: AsyncSession) -> dict:
+    """
+    Send daily alert emails for expiring certificates
+    Called by scheduled task (Celery)
+    """
+    alerts = await check_expiring_certificates(db)
+    
+    # Rows arrive ordered by company, so grouping is a single pass
+    company_alerts = {
+        company_id: list(company_rows)
+        for company_id, company_rows in groupby(alerts, key=attrgetter("company_id"))
+    }
+    
+    # Active users of every alerted company in one round trip
+    result = await db.execute(
+        select(User.company_id, User.email).where(
+            User.company_id.in_(list(company_alerts)),
+            User.is_active == True
+        )
+    )
+    recipients_by_company = defaultdict(list)
+    for company_id, email in result:
+        recipients_by_company[company_id].append(email)
+    
+    # Companies are independent: send concurrently over a shared pool of at most
+    # smtp_max_parallel sessions, so each TLS handshake + AUTH serves many companies
+    pool = None
+    if _smtp_configured():
+        pool = SMTPPool(settings.smtp_max_parallel)
+    
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tasks = [
+                tg.create_task(_send_company_alerts(
+                    pool, company_alert_list, recipients_by_company[company_id]
+                ))
+                for company_id, company_alert_list in company_alerts.items()
+            ]
+    finally:
+        if pool:
+            await pool.close()
+    
+    results = [task.result() for task in tasks]
     
     return {
         "total_alerts": len(alerts),
-        "sent": sent_count,
-        "failed": failed_count
+        "sent": sum(sent for sent, _ in results),
+        "failed": sum(failed for _, failed in results)
     }
-
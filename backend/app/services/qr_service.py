@@ -2,26 +2,57 @@
 QR Code Service
 Generate QR codes for asset tracking
 """
+import asyncio
+import hashlib
 import os
+import threading
+import uuid
+from functools import lru_cache
+from pathlib import Path
 import qrcode
 from qrcode.image.styledpil import StyledPilImage
 from qrcode.image.styles.moduledrawers import RoundedModuleDrawer
 from io import BytesIO
 import base64
 
+from sqlalchemy import update
+
 from app.config import settings
+from app.database import async_session_maker
+from app.models.asset import Asset
+
 
+# QR codes directory, resolved once (created on first render, see _ensure_qr_dir)
+QR_CODES_DIR = Path(__file__).resolve().parents[2] / "static" / "qrcodes"
 
-# Ensure QR codes directory exists
-QR_CODES_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "static", "qrcodes")
-os.makedirs(QR_CODES_DIR, exist_ok=True)
+# Asset QR payloads are "CT-{asset_uuid}"
+QR_DATA_PREFIX = "CT-"
 
 
-async def generate_qr_code(data: str, asset_id: str) -> str:
+async def generate_qr_code(data: str, force: bool = False) -> str:
     """
     Generate QR code for asset tracking
-    Returns the file path or base64 encoded image
+    Returns the stored file's relative path; an existing file for the same data
+    is reused unless force is set
     """
+    # Rasterizing and writing the PNG is blocking work; keep it off the event loop
+    return await asyncio.to_thread(_render_qr_sync, data, force)
+
+
+@lru_cache(maxsize=1)
+def _ensure_qr_dir() -> None:
+    """Create the QR codes directory once per process (workers may start without the API)"""
+    QR_CODES_DIR.mkdir(parents=True, exist_ok=True)
+
+
+def _render_qr_sync(data: str, force: bool = False) -> str:
+    """Render the styled QR PNG into QR_CODES_DIR (runs in a worker thread)"""
+    # Files are named by a hash of the encoded data, so identical re-renders reuse the file
+    filename = f"{hashlib.sha256(data.encode()).hexdigest()}.png"
+    filepath = QR_CODES_DIR / filename
+    if not force and filepath.exists():
+        return f"/static/qrcodes/{filename}"
+    
     # Create QR code with custom styling
     qr = qrcode.QRCode(
         version=1,
@@ -42,20 +73,40 @@ async def generate_qr_code(data: str, asset_id: str) -> str:
         back_color="white"
     )
     
-    # Save to file
-    filename = f"{asset_id}.png"
-    filepath = os.path.join(QR_CODES_DIR, filename)
-    img.save(filepath)
+    # Save under a temporary name, then move into place atomically
+    _ensure_qr_dir()
+    tmp_path = filepath.with_name(f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp")
+    img.save(tmp_path, format="PNG")
+    os.replace(tmp_path, filepath)
     
     # Return relative path for storage
     return f"/static/qrcodes/{filename}"
 
 
+async def render_asset_qr(asset_id: uuid.UUID, qr_data: str, force: bool = False) -> None:
+    """
+    Render an asset's QR code and store its path on the asset
+    Runs as a background task after the response, with its own session
+    """
+    qr_code = await generate_qr_code(qr_data, force=force)
+    
+    async with async_session_maker() as session:
+        await session.execute(
+            update(Asset).where(Asset.id == asset_id).values(qr_code=qr_code)
+        )
+        await session.commit()
+
+
 async def generate_qr_code_base64(data: str) -> str:
     """
     Generate QR code and return as base64 string
     Useful for embedding in PDFs
     """
+    return await asyncio.to_thread(_render_qr_base64_sync, data)
+
+
+def _render_qr_base64_sync(data: str) -> str:
+    """Render a plain QR PNG as a data URI (runs in a worker thread)"""
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_H,
@@ -68,10 +119,10 @@ async def generate_qr_code_base64(data: str) -> str:
     
     img = qr.make_image(fill_color="#1a1a1a", back_color="white")
     
-    # Convert to base64
+    # Convert to base64 (encode from the buffer's memory, without a bytes copy)
     buffer = BytesIO()
     img.save(buffer, format="PNG")
-    img_str = base64.b64encode(buffer.getvalue()).decode()
+    img_str = base64.b64encode(buffer.getbuffer()).decode("ascii")
     
     return f"data:image/png;base64,{img_str}"
 
@@ -81,15 +132,16 @@ def decode_qr_data(qr_data: str) -> dict:
     Parse QR code data
     Format: CT-{asset_uuid}
     """
-    if not qr_data.startswith("CT-"):
+    if not qr_data.startswith(QR_DATA_PREFIX):
         return {"valid": False, "error": "Invalid QR format"}
     
+    asset_id = qr_data[len(QR_DATA_PREFIX):]
     try:
-        asset_id = qr_data.replace("CT-", "")
-        return {
-            "valid": True,
-            "asset_id": asset_id,
-        }
-    except Exception as e:
-        return {"valid": False, "error": str(e)}
-
+        uuid.UUID(asset_id)
+    except ValueError:
+        return {"valid": False, "error": "Invalid asset ID in QR code"}
+    
+    return {
+        "valid": True,
+        "asset_id": asset_id,
+    }
@@ -0,0 +1,91 @@
+"""
+SMTP Pool
+Reusable authenticated SMTP sessions for batch email sends
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Tuple
+
+import aiosmtplib
+
+from app.config import settings
+
+# Idle sessions older than this are checked with NOOP before reuse
+IDLE_CHECK_SECONDS = 30
+
+
+async def open_smtp() -> aiosmtplib.SMTP:
+    """Connect and authenticate one SMTP session"""
+    client = aiosmtplib.SMTP(
+        hostname=settings.smtp_host,
+        port=settings.smtp_port,
+        use_tls=True,
+    )
+    await client.connect()
+    await client.login(settings.smtp_user, settings.smtp_password)
+    return client
+
+
+async def _close(client: aiosmtplib.SMTP) -> None:
+    """Say QUIT if still connected, ignoring errors"""
+    try:
+        if client.is_connected:
+            await client.quit()
+    except aiosmtplib.SMTPException:
+        client.close()
+
+
+class SMTPPool:
+    """
+    At most `size` SMTP sessions, connected on demand and reused across tasks
+    Each session serves one task at a time (SMTP is sequential per connection)
+    """
+
+    def __init__(self, size: int):
+        self._slots = asyncio.Semaphore(size)
+        # Most recently released first, so warm sessions are reused before stale ones
+        self._idle: asyncio.LifoQueue[Tuple[aiosmtplib.SMTP, float]] = asyncio.LifoQueue()
+
+    async def acquire(self) -> aiosmtplib.SMTP:
+        """Take an idle session (checked with NOOP if idle too long) or open a new one"""
+        await self._slots.acquire()
+        try:
+            while not self._idle.empty():
+                client, released_at = self._idle.get_nowait()
+                if time.monotonic() - released_at < IDLE_CHECK_SECONDS:
+                    return client
+                try:
+                    await client.noop()
+                    return client
+                except aiosmtplib.SMTPException:
+                    await _close(client)
+            return await open_smtp()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def release(self, client: aiosmtplib.SMTP, discard: bool = False) -> None:
+        """Return a session to the pool (dropped if discarded or disconnected)"""
+        if discard or not client.is_connected:
+            await _close(client)
+        else:
+            self._idle.put_nowait((client, time.monotonic()))
+        self._slots.release()
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[aiosmtplib.SMTP]:
+        """Borrow a session for the duration of the block"""
+        client = await self.acquire()
+        try:
+            yield client
+        except BaseException:
+            await self.release(client, discard=True)
+            raise
+        await self.release(client)
+
+    async def close(self) -> None:
+        """Quit every idle session"""
+        while not self._idle.empty():
+            client, _ = self._idle.get_nowait()
+            await _close(client)
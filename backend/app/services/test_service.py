@@ -2,12 +2,123 @@
 Test Service
 Test validation and result calculation
 """
-from datetime import datetime
-from typing import Dict, Any
+import operator
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+from sqlalchemy import Integer, cast, func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert
 
-from app.models.test import Test, TestResult
+from app.models.test import Test, TestNumberCounter, TestResult
+
+@dataclass(frozen=True, slots=True)
+class CheckSpec:
+    """One validation check: what it measures, when it passes, and what it reports"""
+    name: str
+    # Returns the values the check compares, or None when it does not apply to the test
+    measure: Callable[[Test, Dict[str, Any]], Optional[Tuple[Any, ...]]]
+    passes: Callable[..., bool]
+    # str.format templates over the measured values
+    pass_message: str
+    fail_message: str
+    recommendation: str
+    # Critical checks fail the test outright regardless of the pass percentage
+    critical: bool = False
+    # Status reported when the check does not pass ("conditional" does not count as failed)
+    fail_status: str = "fail"
+
+
+# Distinguishes "not recorded" from a recorded None in measured_values
+_MISSING = object()
+
+
+def _within_limit(value_key: str, limit_key: str, default_limit: float):
+    """Measure (value, limit) from measured_values; applies only if the value was recorded"""
+    def measure(test: Test, measured: Dict[str, Any]) -> Optional[Tuple[Any, ...]]:
+        value = measured.get(value_key, _MISSING)
+        if value is _MISSING:
+            return None
+        return value, measured.get(limit_key, default_limit)
+    return measure
+
+
+def _measure_brake_test(test: Test, measured: Dict[str, Any]) -> Optional[Tuple[Any, ...]]:
+    """Brake test outcome; applies only if it was recorded"""
+    brake_ok = measured.get("brake_test", _MISSING)
+    return None if brake_ok is _MISSING else (brake_ok,)
+
+
+def _measure_test_load(test: Test, measured: Dict[str, Any]) -> Tuple[float, float]:
+    """Applied test load and the required load (usually 125% of SWL for proof load)"""
+    swl = test.safe_working_load or 0
+    expected_test_load = swl * (test.test_load_percentage or 125) / 100
+    return test.test_load or 0, expected_test_load
+
+
+# Validation checks, in report order
+CHECK_SPECS = (
+    # Check 1: Test load applied correctly (5% tolerance)
+    CheckSpec(
+        name="load_check",
+        measure=_measure_test_load,
+        passes=lambda test_load, expected: test_load >= expected * 0.95,
+        pass_message="Test load ({0}) meets requirement ({1:.2f})",
+        fail_message="Test load ({0}) below requirement ({1:.2f})",
+        recommendation="Ensure test load is at least 125% of SWL",
+        critical=True,
+    ),
+    # Check 2: Deflection within limits (if provided)
+    CheckSpec(
+        name="deflection_check",
+        measure=_within_limit("deflection", "max_deflection", float("inf")),
+        passes=operator.le,
+        pass_message="Deflection ({0}) within limit ({1})",
+        fail_message="Deflection ({0}) exceeds limit ({1})",
+        recommendation="Excessive deflection detected - investigate structural integrity",
+    ),
+    # Check 3: Visual inspection (defects make the result conditional)
+    CheckSpec(
+        name="visual_check",
+        measure=lambda test, measured: (test.defects_found,),
+        passes=lambda defects: not (defects and defects.strip()),
+        pass_message="No defects found during visual inspection",
+        fail_message="Defects noted: {0:.100}...",
+        recommendation="Address noted defects before certification",
+        fail_status="conditional",
+    ),
+    # Check 4: Permanent deformation (if measured, default limit 0.25%)
+    CheckSpec(
+        name="deformation_check",
+        measure=_within_limit("permanent_deformation", "max_permanent_deformation", 0.25),
+        passes=operator.le,
+        pass_message="Permanent deformation ({0}%) within limit ({1}%)",
+        fail_message="Permanent deformation ({0}%) exceeds limit ({1}%)",
+        recommendation="Permanent deformation exceeds acceptable limits - equipment may be compromised",
+        critical=True,
+    ),
+    # Check 5: Brake test (for cranes/hoists)
+    CheckSpec(
+        name="brake_check",
+        measure=_measure_brake_test,
+        passes=bool,
+        pass_message="Brake test passed",
+        fail_message="Brake test failed",
+        recommendation="Brake system requires immediate attention",
+        critical=True,
+    ),
+    # Check 6: Load indicator accuracy (for measuring equipment, default tolerance 0.5%)
+    CheckSpec(
+        name="accuracy_check",
+        measure=_within_limit("indicator_accuracy", "accuracy_tolerance", 0.5),
+        passes=operator.le,
+        pass_message="Indicator accuracy ({0}%) within tolerance ({1}%)",
+        fail_message="Indicator accuracy ({0}%) outside tolerance ({1}%)",
+        recommendation="Load indicator requires calibration",
+    ),
+)
+
+CRITICAL_CHECKS = frozenset(spec.name for spec in CHECK_SPECS if spec.critical)
 
 
 async def generate_test_number(db: AsyncSession) -> str:
@@ -15,21 +126,41 @@ async def generate_test_number(db: AsyncSession) -> str:
     Generate unique test number
     Format: TST-YYYYMMDD-XXXX
     """
-    today = datetime.utcnow().strftime("%Y%m%d")
-    prefix = f"TST-{today}-"
+    today = datetime.now(timezone.utc).date()
+    prefix = f"TST-{today:%Y%m%d}-"
     
-    # Get count of tests today
+    # Claim today's next number on the counter row; the row lock serializes
+    # concurrent claims until the transaction ends
     result = await db.execute(
-        select(func.count(Test.id)).where(
-            Test.test_number.like(f"{prefix}%")
-        )
+        update(TestNumberCounter)
+        .where(TestNumberCounter.day == today)
+        .values(last_value=TestNumberCounter.last_value + 1)
+        .returning(TestNumberCounter.last_value)
     )
-    count = result.scalar() or 0
+    number = result.scalar_one_or_none()
     
-    # Generate new number
-    new_number = f"{prefix}{count + 1:04d}"
+    if number is None:
+        # First claim of the day: start after any number already issued today
+        # (tests created before the counter existed), racing claims fall to the upsert
+        suffix = cast(func.substring(Test.test_number, "[0-9]+$"), Integer)
+        issued = (
+            select(func.coalesce(func.max(suffix), 0))
+            .where(Test.test_number.like(f"{prefix}%"))
+            .scalar_subquery()
+        )
+        result = await db.execute(
+            insert(TestNumberCounter)
+            .values(day=today, last_value=issued + 1)
+            .on_conflict_do_update(
+                index_elements=[TestNumberCounter.day],
+                set_={"last_value": TestNumberCounter.last_value + 1},
+            )
+            .returning(TestNumberCounter.last_value)
+        )
+        number = result.scalar_one()
     
-    return new_number
+    # Generate new number
+    return f"{prefix}{number:04d}"
 
 
 def validate_test_result(test: Test) -> Dict[str, Any]:
@@ -44,141 +175,49 @@ def validate_test_result(test: Test) -> Dict[str, Any]:
     """
     details = {}
     recommendations = []
+    failed = set()  # Names of checks with status "fail"
     
     # Get measured values
     measured = test.measured_values or {}
-    swl = test.safe_working_load or 0
-    test_load = test.test_load or 0
     
     # Validation checks
     checks_passed = 0
     total_checks = 0
     
-    # Check 1: Test load applied correctly (usually 125% of SWL for proof load)
-    total_checks += 1
-    expected_test_load = swl * (test.test_load_percentage or 125) / 100
-    
-    if test_load >= expected_test_load * 0.95:  # Allow 5% tolerance
-        details["load_check"] = {
-            "status": "pass",
-            "message": f"Test load ({test_load}) meets requirement ({expected_test_load:.2f})"
-        }
-        checks_passed += 1
-    else:
-        details["load_check"] = {
-            "status": "fail",
-            "message": f"Test load ({test_load}) below requirement ({expected_test_load:.2f})"
-        }
-        recommendations.append("Ensure test load is at least 125% of SWL")
-    
-    # Check 2: Deflection within limits (if provided)
-    if "deflection" in measured:
-        total_checks += 1
-        deflection = measured["deflection"]
-        max_deflection = measured.get("max_deflection", float("inf"))
+    for spec in CHECK_SPECS:
+        values = spec.measure(test, measured)
+        if values is None:
+            continue
         
-        if deflection <= max_deflection:
-            details["deflection_check"] = {
-                "status": "pass",
-                "message": f"Deflection ({deflection}) within limit ({max_deflection})"
-            }
-            checks_passed += 1
-        else:
-            details["deflection_check"] = {
-                "status": "fail",
-                "message": f"Deflection ({deflection}) exceeds limit ({max_deflection})"
-            }
-            recommendations.append("Excessive deflection detected - investigate structural integrity")
-    
-    # Check 3: Visual inspection (if defects found)
-    total_checks += 1
-    if test.defects_found and len(test.defects_found.strip()) > 0:
-        details["visual_check"] = {
-            "status": "conditional",
-            "message": f"Defects noted: {test.defects_found[:100]}..."
-        }
-        recommendations.append("Address noted defects before certification")
-    else:
-        details["visual_check"] = {
-            "status": "pass",
-            "message": "No defects found during visual inspection"
-        }
-        checks_passed += 1
-    
-    # Check 4: Permanent deformation (if measured)
-    if "permanent_deformation" in measured:
         total_checks += 1
-        deformation = measured["permanent_deformation"]
-        max_deformation = measured.get("max_permanent_deformation", 0.25)  # Default 0.25%
-        
-        if deformation <= max_deformation:
-            details["deformation_check"] = {
+        if spec.passes(*values):
+            details[spec.name] = {
                 "status": "pass",
-                "message": f"Permanent deformation ({deformation}%) within limit ({max_deformation}%)"
+                "message": spec.pass_message.format(*values)
             }
             checks_passed += 1
         else:
-            details["deformation_check"] = {
-                "status": "fail",
-                "message": f"Permanent deformation ({deformation}%) exceeds limit ({max_deformation}%)"
+            details[spec.name] = {
+                "status": spec.fail_status,
+                "message": spec.fail_message.format(*values)
             }
-            recommendations.append("Permanent deformation exceeds acceptable limits - equipment may be compromised")
-    
-    # Check 5: Brake test (for cranes/hoists)
-    if "brake_test" in measured:
-        total_checks += 1
-        brake_ok = measured["brake_test"]
-        
-        if brake_ok:
-            details["brake_check"] = {
-                "status": "pass",
-                "message": "Brake test passed"
-            }
-            checks_passed += 1
-        else:
-            details["brake_check"] = {
-                "status": "fail",
-                "message": "Brake test failed"
-            }
-            recommendations.append("Brake system requires immediate attention")
-    
-    # Check 6: Load indicator accuracy (for measuring equipment)
-    if "indicator_accuracy" in measured:
-        total_checks += 1
-        accuracy = measured["indicator_accuracy"]
-        tolerance = measured.get("accuracy_tolerance", 0.5)  # Default 0.5%
-        
-        if accuracy <= tolerance:
-            details["accuracy_check"] = {
-                "status": "pass",
-                "message": f"Indicator accuracy ({accuracy}%) within tolerance ({tolerance}%)"
-            }
-            checks_passed += 1
-        else:
-            details["accuracy_check"] = {
-                "status": "fail",
-                "message": f"Indicator accuracy ({accuracy}%) outside tolerance ({tolerance}%)"
-            }
-            recommendations.append("Load indicator requires calibration")
+            if spec.fail_status == "fail":
+                failed.add(spec.name)
+            recommendations.append(spec.recommendation)
     
     # Calculate final result
     pass_percentage = (checks_passed / total_checks * 100) if total_checks > 0 else 0
     
     if pass_percentage == 100:
         result = TestResult.PASS
-    elif pass_percentage >= 75 and not any(
-        d.get("status") == "fail" for d in details.values()
-    ):
+    elif pass_percentage >= 75 and not failed:
         result = TestResult.CONDITIONAL
     else:
         result = TestResult.FAIL
     
     # Override to fail if critical checks failed
-    critical_checks = ["load_check", "brake_check", "deformation_check"]
-    for check in critical_checks:
-        if check in details and details[check].get("status") == "fail":
-            result = TestResult.FAIL
-            break
+    if not failed.isdisjoint(CRITICAL_CHECKS):
+        result = TestResult.FAIL
     
     return {
         "result": result,
@@ -0,0 +1,46 @@
+"""
+CertiTrack Templates
+Shared Jinja2 environment for certificate PDFs and notification emails
+"""
+import os
+import stat
+from typing import Optional
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+
+from app.config import settings
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "templates")
+
+
+def _bytecode_cache() -> Optional[FileSystemBytecodeCache]:
+    """On-disk bytecode cache so fresh workers skip parsing and compiling templates"""
+    if not settings.jinja_bytecode_cache:
+        return None
+    directory = settings.jinja_bytecode_cache_dir
+    if directory:
+        # Cached bytecode is executed, so nobody else may be able to write it
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        info = os.lstat(directory)
+        if (
+            not stat.S_ISDIR(info.st_mode)
+            or info.st_uid != os.getuid()
+            or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+        ):
+            raise RuntimeError(
+                f"Jinja bytecode cache {directory} must be a directory owned by "
+                "this user and not writable by group or others"
+            )
+    # Without a directory Jinja uses (and checks) a private 0700 temp directory
+    return FileSystemBytecodeCache(directory=directory, pattern="__jinja2_%s.cache")
+
+
+# Templates ship with the code, so they are compiled once per process and never re-checked
+jinja_env = Environment(
+    loader=FileSystemLoader(TEMPLATES_DIR),
+    autoescape=select_autoescape(["html", "html.j2"]),
+    auto_reload=False,
+    trim_blocks=True,
+    lstrip_blocks=True,
+    bytecode_cache=_bytecode_cache(),
+)
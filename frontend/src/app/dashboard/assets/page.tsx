@@ -58,7 +58,9 @@ export default function AssetsPage() {
   const [search, setSearch] = useState(searchParams.get('search') || '')
   const [category, setCategory] = useState(searchParams.get('category') || '')
   const [status, setStatus] = useState(searchParams.get('status') || '')
-  const [page, setPage] = useState(1)
+  // Cursor of every page visited so far; the last entry is the current page
+  const [cursors, setCursors] = useState<(string | undefined)[]>([undefined])
+  const page = cursors.length
   const pageSize = 20
 
   const handleSelectAsset = (assetId: string) => {
@@ -68,11 +70,11 @@ export default function AssetsPage() {
   }
 
   const { data, isLoading } = useQuery({
-    queryKey: ['assets', page, search, category, status],
+    queryKey: ['assets', cursors[cursors.length - 1], search, category, status],
     queryFn: () =>
       assetsApi.list({
-        page,
-        page_size: pageSize,
+        cursor: cursors[cursors.length - 1],
+        limit: pageSize,
         search: search || undefined,
         category: category || undefined,
         status: status || undefined,
@@ -81,7 +83,7 @@ export default function AssetsPage() {
 
   const handleSearch = (e: React.FormEvent) => {
     e.preventDefault()
-    setPage(1)
+    setCursors([undefined])
   }
 
   return (
@@ -278,29 +280,29 @@ export default function AssetsPage() {
               </div>
 
               {/* Pagination */}
-              {data.pages > 1 && (
+              {(page > 1 || data.next_cursor) && (
                 <div className="flex items-center justify-between px-6 py-4 border-t border-dark-100">
                   <p className="text-sm text-dark-500">
                     Showing {(page - 1) * pageSize + 1} to{' '}
-                    {Math.min(page * pageSize, data.total)} of {data.total} assets
+                    {(page - 1) * pageSize + data.items.length} assets
                   </p>
                   <div className="flex items-center gap-2">
                     <Button
                       variant="outline"
                       size="sm"
-                      onClick={() => setPage(page - 1)}
+                      onClick={() => setCursors(cursors.slice(0, -1))}
                       disabled={page === 1}
                     >
                       <ChevronLeft className="w-4 h-4" />
                     </Button>
                     <span className="text-sm text-dark-600">
-                      Page {page} of {data.pages}
+                      Page {page}
                     </span>
                     <Button
                       variant="outline"
                       size="sm"
-                      onClick={() => setPage(page + 1)}
-                      disabled={page === data.pages}
+                      onClick={() => setCursors([...cursors, data.next_cursor])}
+                      disabled={!data.next_cursor}
                     >
                       <ChevronRight className="w-4 h-4" />
                     </Button>
@@ -2,12 +2,12 @@
 
 import { useState, useEffect } from 'react'
 import { useRouter, useSearchParams } from 'next/navigation'
-import { useQuery } from '@tanstack/react-query'
+import { useQuery, useQueryClient } from '@tanstack/react-query'
 import { useForm } from 'react-hook-form'
 import { zodResolver } from '@hookform/resolvers/zod'
 import { z } from 'zod'
 import toast from 'react-hot-toast'
-import { ArrowLeft, FileCheck, Download, CheckCircle2 } from 'lucide-react'
+import { ArrowLeft, FileCheck, Download, CheckCircle2, AlertCircle, RefreshCw } from 'lucide-react'
 import Link from 'next/link'
 
 import { Header } from '@/components/layout/header'
@@ -40,6 +40,9 @@ const typeOptions = [
   { value: 'annual', label: 'Annual Certification' },
 ]
 
+// Stop polling /pdf-status if the render has not finished by then
+const PDF_STATUS_TIMEOUT_MS = 60_000
+
 const validityOptions = [
   { value: '90', label: '90 Days (3 Months)' },
   { value: '180', label: '180 Days (6 Months)' },
@@ -53,11 +56,14 @@ export default function GenerateCertificatePage() {
   const assetId = searchParams.get('asset_id')
   const testId = searchParams.get('test_id')
   const { user } = useAuthStore()
+  const queryClient = useQueryClient()
 
   const [isLoading, setIsLoading] = useState(false)
   const [isDownloading, setIsDownloading] = useState(false)
   const [certificate, setCertificate] = useState<any>(null)
   const [showSuccessModal, setShowSuccessModal] = useState(false)
+  const [pdfTimedOut, setPdfTimedOut] = useState(false)
+  const [isRetryingPdf, setIsRetryingPdf] = useState(false)
 
   const handleDownload = async () => {
     if (!certificate) return
@@ -84,6 +90,38 @@ export default function GenerateCertificatePage() {
     }
   }
 
+  // PDF is rendered in the background after generation; poll until it is
+  // ready, the render failed, or we give up waiting
+  const pdfStatusKey = ['certificate-pdf-status', certificate?.id]
+  const { data: pdfStatus } = useQuery({
+    queryKey: pdfStatusKey,
+    queryFn: () => certificatesApi.pdfStatus(certificate!.id),
+    enabled: !!certificate && !certificate.pdf_url && !pdfTimedOut,
+    refetchInterval: (query) => (query.state.data?.status === 'pending' || !query.state.data ? 1000 : false),
+  })
+  const pdfReady = !!(certificate?.pdf_url || pdfStatus?.ready)
+  const pdfFailed = !pdfReady && (pdfStatus?.status === 'failed' || pdfTimedOut)
+
+  useEffect(() => {
+    if (!certificate || pdfReady || pdfFailed) return
+    const timer = setTimeout(() => setPdfTimedOut(true), PDF_STATUS_TIMEOUT_MS)
+    return () => clearTimeout(timer)
+  }, [certificate, pdfReady, pdfFailed])
+
+  const handleRetryPdf = async () => {
+    if (!certificate) return
+    setIsRetryingPdf(true)
+    try {
+      // Back to pending; polling resumes from the returned status
+      queryClient.setQueryData(pdfStatusKey, await certificatesApi.renderPdf(certificate.id))
+      setPdfTimedOut(false)
+    } catch (error: any) {
+      toast.error(getApiErrorMessage(error, 'Failed to restart PDF generation'))
+    } finally {
+      setIsRetryingPdf(false)
+    }
+  }
+
   const { data: asset, isLoading: assetLoading } = useQuery({
     queryKey: ['asset', assetId],
     queryFn: () => assetsApi.get(assetId!),
@@ -370,7 +408,7 @@ export default function GenerateCertificatePage() {
               >
                 View All Certificates
               </Button>
-              {certificate.pdf_url && (
+              {pdfReady ? (
                 <Button 
                   variant="accent" 
                   className="flex-1"
@@ -380,8 +418,31 @@ export default function GenerateCertificatePage() {
                   <Download className="w-4 h-4 mr-2" />
                   Download PDF
                 </Button>
+              ) : pdfFailed ? (
+                <Button
+                  variant="danger"
+                  className="flex-1"
+                  onClick={handleRetryPdf}
+                  isLoading={isRetryingPdf}
+                >
+                  <RefreshCw className="w-4 h-4 mr-2" />
+                  Retry PDF
+                </Button>
+              ) : (
+                <Button variant="accent" className="flex-1" isLoading>
+                  Preparing PDF
+                </Button>
               )}
             </div>
+
+            {pdfFailed && (
+              <p className="flex items-center justify-center gap-2 text-sm text-error mt-4">
+                <AlertCircle className="w-4 h-4" />
+                {pdfStatus?.status === 'failed'
+                  ? 'PDF generation failed.'
+                  : 'PDF generation is taking longer than expected.'}
+              </p>
+            )}
           </div>
         )}
       </Modal>
@@ -25,7 +25,6 @@ const statusOptions = [
 ]
 
 export default function CertificatesPage() {
-  const [page, setPage] = useState(1)
   const [status, setStatus] = useState('')
   const [expiringOnly, setExpiringOnly] = useState(false)
   const [downloadingId, setDownloadingId] = useState<string | null>(null)
@@ -55,11 +54,10 @@ export default function CertificatesPage() {
   }
 
   const { data: certificates, isLoading } = useQuery({
-    queryKey: ['certificates', page, status, expiringOnly],
+    queryKey: ['certificates', status, expiringOnly],
     queryFn: () =>
       certificatesApi.list({
-        page,
-        page_size: 20,
+        limit: 20,
         status: status || undefined,
         expiring_soon: expiringOnly || undefined,
       }),
@@ -32,16 +32,14 @@ const resultOptions = [
 ]
 
 export default function TestsPage() {
-  const [page, setPage] = useState(1)
   const [status, setStatus] = useState('')
   const [result, setResult] = useState('')
 
   const { data: tests, isLoading } = useQuery({
-    queryKey: ['tests', page, status, result],
+    queryKey: ['tests', status, result],
     queryFn: () =>
       testsApi.list({
-        page,
-        page_size: 20,
+        limit: 20,
         status: status || undefined,
         result: result || undefined,
       }),
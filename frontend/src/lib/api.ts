@@ -174,8 +174,8 @@ export const userApi = {
 // Assets API
 export const assetsApi = {
   list: async (params?: {
-    page?: number
-    page_size?: number
+    cursor?: string
+    limit?: number
     search?: string
     category?: string
     asset_type?: string
@@ -237,8 +237,8 @@ export const assetsApi = {
 // Tests API
 export const testsApi = {
   list: async (params?: {
-    page?: number
-    page_size?: number
+    cursor?: string
+    limit?: number
     asset_id?: string
     status?: string
     result?: string
@@ -295,8 +295,8 @@ export const testsApi = {
 // Certificates API
 export const certificatesApi = {
   list: async (params?: {
-    page?: number
-    page_size?: number
+    cursor?: string
+    limit?: number
     asset_id?: string
     status?: string
     expiring_soon?: boolean
@@ -335,6 +335,16 @@ export const certificatesApi = {
     return response.data
   },
 
+  pdfStatus: async (id: string) => {
+    const response = await api.get(`/certificates/${id}/pdf-status`)
+    return response.data
+  },
+
+  renderPdf: async (id: string) => {
+    const response = await api.post(`/certificates/${id}/render-pdf`)
+    return response.data
+  },
+
   download: (id: string) => {
     return `${API_URL}/certificates/${id}/download`
   },